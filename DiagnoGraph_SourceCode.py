@@ -1,247 +1,362 @@
 # Sai
 
 import streamlit as st
-import pandas as pd
-from st_circular_progress import CircularProgress
-from PIL import Image
 import base64
+import os
+from patient_data import PatientIndex, current_snapshot
+from rollups import GRAINS, PERIODS, PatientRollups, RollupStore
+from trend_forecast import TrendStore
+from risk_assessment import RISK_LEVELS, assess_cohort
+from risk_model import latest_model_path, load_model
+from alerts import VITAL_LABELS, AlertStore, PatientAlerts
+from patient_views import PatientViewCache
+from sqlite_store import SQLITE_PATH, SQLitePatientStore
+import telemetry
+from telemetry import counted, span, timed
 
 st.set_page_config(page_title="Medical Report Dashboard", layout="wide")
+rerun = span("dashboard.rerun").start()
 st.title("Medical Report Dashboard")
 
 
-@st.cache_data
-def get_base64_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode()
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
-base64_image_string = get_base64_image("bg.webp")
-
-st.markdown(
-    f"""
-        <style>
-        .stApp {{
-            background-image: url("data:image/webp;base64,{base64_image_string}");
-            background-size: cover;
-            background-repeat: no-repeat;
-            background-attachment: fixed;
-            background-position: center center;
-        }}
-
-        [data-testid="stSidebar"] > div:first-child {{
-            background-color: transparent;
-        }}
-        </style>
-        """,
-    unsafe_allow_html=True
-)
-
-with st.sidebar:
-    logo = Image.open("logo.webp")
-    st.image(logo, use_container_width=True)
+with span("dashboard.sidebar"), st.sidebar:
+    # A path is served as the file's own bytes; a PIL image would be decoded and re-encoded every rerun
+    st.image(os.path.join(ASSET_DIR, "logo.png"), use_container_width=True)
     st.title("Patient Details")
     patient_id = st.text_input("Enter Patient ID", value="12")
     patient_id = patient_id.strip()
 
 
-@st.cache_data
-def load_summary_data():
-    details_df = pd.read_csv("all_patients_details.csv")
-    history_df = pd.read_csv("medical_history.csv")
-    records_df = pd.read_csv("health_records.csv")
-    for df in [details_df, history_df, records_df]:
-        if 'patient_id' in df.columns:
-            df['patient_id'] = df['patient_id'].astype(str).str.strip()
-    return details_df, history_df, records_df
+# With DIAGNOGRAPH_SHARED_DIR set, every server process attaches to the same
+# published snapshot; publishing a new one moves the key and evicts the old view
+@counted(st.cache_resource(max_entries=1))
+def load_summary_data(snapshot=None):
+    # DIAGNOGRAPH_SQLITE keeps the tables on disk; every section queries one patient at a time
+    if SQLITE_PATH:
+        return SQLitePatientStore(SQLITE_PATH)
+    if snapshot:
+        return PatientIndex.attach(snapshot)
+    return PatientIndex.load()
 
 
-details_df, history_df, records_df = load_summary_data()
-bp_data = records_df[records_df['patient_id'] == patient_id]
+# The SQLite store and an attached snapshot are read one patient at a time: the
+# full rollup, alert and trend tables would be a private copy in every process
+@counted(st.cache_resource(max_entries=1))
+def load_rollups(snapshot=None):
+    if SQLITE_PATH or snapshot:
+        return PatientRollups(load_summary_data(snapshot))
+    return RollupStore(load_summary_data(snapshot))
 
-if 'date_recorded' in bp_data.columns:
-    bp_data['date_recorded'] = pd.to_datetime(bp_data['date_recorded'], errors='coerce')
-    bp_data = bp_data.sort_values('date_recorded')
-    bp_data = bp_data.groupby('date_recorded').mean(numeric_only=True).reset_index()
 
-st.header("Patient Details")
+@counted(st.cache_resource(max_entries=1))
+def load_trends(snapshot=None):
+    return TrendStore(load_summary_data(snapshot), batch=not (SQLITE_PATH or snapshot))
 
-with st.container():
-    col1, col2, col3 = st.columns([1, 1, 1])
-    with col1:
-        st.subheader("Blood Pressure")
-        if not bp_data.empty:
-            bp_df = bp_data[['date_recorded', 'blood_pressure_systolic', 'blood_pressure_diastolic']].set_index(
-                'date_recorded')
-            st.line_chart(bp_df.rename(columns={
-                'blood_pressure_systolic': 'Systolic (mmHg)',
-                'blood_pressure_diastolic': 'Diastolic (mmHg)'
-            }))
-        else:
-            st.warning("No blood pressure data available for this patient.")
 
-    with col2:
-        st.subheader("Heart Rate")
-        if not bp_data.empty:
-            hr_df = bp_data[['date_recorded', 'heart_rate']].set_index('date_recorded')
-            st.area_chart(hr_df.rename(columns={'heart_rate': 'Heart Rate (bpm)'}))
-        else:
-            st.warning("No heart rate data available for this patient.")
-
-    with col3:
-        st.subheader("Respiratory Rate")
-        if not bp_data.empty:
-            resp_df = bp_data[['date_recorded', 'respiratory_rate']].set_index('date_recorded')
-            st.bar_chart(hr_df.rename(columns={'respiratory_rate': 'Respiratory Rate'}))
-        else:
-            st.warning("No breathing rate data available for this patient.")
-
-st.subheader("Blood Glucose")
-if not bp_data.empty:
-    glucose_df = bp_data[['date_recorded', 'blood_sugar_level']].set_index('date_recorded')
-    st.line_chart(glucose_df.rename(columns={'blood_sugar_level': 'Blood Glucose (mg/dL)'}))
-else:
-    st.warning("No blood glucose data available for this patient.")
+@counted(st.cache_resource(max_entries=1))
+def load_alerts(snapshot=None):
+    if SQLITE_PATH or snapshot:
+        return PatientAlerts(load_summary_data(snapshot))
+    return AlertStore(load_summary_data(snapshot))
 
-st.divider()
 
-st.header("Vitals")
-if not bp_data.empty:
-    hr_df = bp_data[['date_recorded', 'heart_rate']].set_index('date_recorded')
-    st.line_chart(hr_df.rename(columns={'heart_rate': 'Heart Rate (bpm)'}))
-else:
-    st.warning("No heart rate data available for this patient.")
+# Prepared per-patient views, shared by every session on this server
+@counted(st.cache_resource(max_entries=1))
+def load_views(snapshot=None):
+    return PatientViewCache(load_summary_data(snapshot), load_rollups(snapshot))
 
-st.divider()
-
-st.header("Alerts & Flags")
 
-st.divider()
+with span("dashboard.load"):
+    snapshot = current_snapshot()
+    patient_index = load_summary_data(snapshot)
+    patient_index.refresh()
+    alert_store = load_alerts(snapshot)
+    patient_views = load_views(snapshot)
 
-st.header("General")
 
-with st.container():
+# Sections are fragments so that a widget inside one (the chart resolution,
+# the review box, the Summarise button) reruns only that section instead of
+# re-rendering every chart on the page
+@st.fragment
+@timed("dashboard.vital_charts")
+def show_vital_charts(patient_id):
+    st.header("Patient Details")
     col1, col2 = st.columns([1, 1])
-    with col1:
-        st.subheader("Weight")
-        weight = round(bp_data['weight'].iloc[-1], 2)
-        weight_value = weight
+    grain = col1.selectbox("Resolution", list(GRAINS), format_func=GRAINS.get)
+    days = col2.selectbox("Period", list(PERIODS), format_func=PERIODS.get)
+    with span("dashboard.patient_view"):
+        charts = patient_views.charts(patient_id, grain, days)
+
+    with st.container():
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            st.subheader("Blood Pressure")
+            if charts is not None:
+                st.line_chart(charts['blood_pressure'])
+            else:
+                st.warning("No blood pressure data available for this patient.")
+
+        with col2:
+            st.subheader("Heart Rate")
+            if charts is not None:
+                st.area_chart(charts['heart_rate'])
+            else:
+                st.warning("No heart rate data available for this patient.")
+
+        with col3:
+            st.subheader("Respiratory Rate")
+            if charts is not None:
+                st.bar_chart(charts['respiratory_rate'])
+            else:
+                st.warning("No breathing rate data available for this patient.")
+
+    st.subheader("Blood Glucose")
+    if charts is not None:
+        st.line_chart(charts['blood_glucose'])
+    else:
+        st.warning("No blood glucose data available for this patient.")
 
-        st.markdown(f"<h1 style='text-align: center; color: #FFFFFF;'>{weight_value} kgs</h1>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center; color: #FFFFFF;'>Current Weight</p>", unsafe_allow_html=True)
+    st.divider()
 
-        st.subheader("Height")
-        height = round(bp_data['height'].iloc[-1], 2)
-        height_value = height
+    st.header("Vitals")
+    if charts is not None:
+        st.line_chart(charts['heart_rate'])
+        forecast = load_trends(snapshot).forecast(patient_id, 30)
+        if forecast is not None:
+            st.caption(f"Trend projection in 30 days: {forecast['heart_rate']:.0f} bpm")
+    else:
+        st.warning("No heart rate data available for this patient.")
 
-        st.markdown(f"<h1 style='text-align: center; color: #FFFFFF;'>{height_value} meters</h1>",
-                    unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center; color: #FFFFFF;'>Current Height</p>", unsafe_allow_html=True)
 
-    with col2:
-        st.subheader("BMI")
-        height = round(bp_data['height'].iloc[-1], 2)
-        weight = round(bp_data['weight'].iloc[-1], 2)
-        bmi_value =  round(weight/(height ** 2),2)
-        max_bmi = 40.0
-        progress_percent = int((bmi_value / max_bmi) * 100)
-        progress_percent = min(100, max(0, progress_percent))
-
-        cp = CircularProgress(
-            label="BMI",
-            value=progress_percent,
-            key="bmi_progress",
-            size="large",
-            color="rgb(255, 182, 193)",
-            track_color="rgb(222, 235, 245)",
-        )
-        cp.st_circular_progress()
-
-        st.markdown(f"<h1 style='text-align: center;'>{bmi_value} </h1>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'>BMI Value </p>", unsafe_allow_html=True)
-
-        if bmi_value < 18.5:
-            st.info("UnderWeight")
-        elif 18.5 <= bmi_value < 25.0:
-            st.success("Healthy")
-        elif 25.0 <= bmi_value < 30.0:
-            st.warning("OverWeight")
-        else:
-            st.error("Obese")
+show_vital_charts(patient_id)
 
+st.divider()
 
-def show_patient_summary(patient_id):
-    global details_df, history_df, records_df
+st.header("Alerts & Flags")
 
-    info = details_df[details_df['patient_id'] == patient_id]
-    history = history_df[history_df['patient_id'] == patient_id]
-    records = records_df[records_df['patient_id'] == patient_id]
+with span("dashboard.alerts"):
+    alerts = alert_store.alerts(patient_id)
+    if alerts.empty:
+        st.success("No readings outside the normal ranges.")
+    else:
+        latest_date = alerts['date_recorded'].iloc[-1]
+        col1, col2 = st.columns([1, 1])
+        col1.metric("Out-of-range values", len(alerts))
+        col2.metric("Latest alert", str(latest_date)[:10])
+        for alert in alerts[alerts['date_recorded'] == latest_date].itertuples():
+            st.error(f"{VITAL_LABELS[alert.vital]}: {alert.value:g} ({alert.direction}, "
+                     f"normal {alert.low:g}-{alert.high:g})")
+        with st.expander("All alerts"):
+            alert_table = alerts.iloc[::-1].drop(columns=['patient_id'])
+            st.dataframe(alert_table.assign(vital=alert_table['vital'].map(VITAL_LABELS)), hide_index=True)
+
+st.divider()
 
-    if info.empty or history.empty or records.empty:
+st.header("General")
+
+with span("dashboard.general"), st.container():
+    latest = patient_views.latest(patient_id)
+    if latest is None:
+        st.warning("No weight, height or BMI data available for this patient.")
+    else:
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            st.subheader("Weight")
+            weight_value = latest['weight']
+
+            st.markdown(f"<h1 style='text-align: center; color: #FFFFFF;'>{weight_value} kgs</h1>",
+                        unsafe_allow_html=True)
+            st.markdown(f"<p style='text-align: center; color: #FFFFFF;'>Current Weight</p>", unsafe_allow_html=True)
+
+            st.subheader("Height")
+            height_value = latest['height']
+
+            st.markdown(f"<h1 style='text-align: center; color: #FFFFFF;'>{height_value} meters</h1>",
+                        unsafe_allow_html=True)
+            st.markdown(f"<p style='text-align: center; color: #FFFFFF;'>Current Height</p>", unsafe_allow_html=True)
+
+        with col2:
+            st.subheader("BMI")
+            bmi_value = latest['bmi']
+            max_bmi = 40.0
+            progress_percent = int((bmi_value / max_bmi) * 100)
+            progress_percent = min(100, max(0, progress_percent))
+
+            # The component loads with the first BMI gauge rather than at startup
+            from st_circular_progress import CircularProgress
+            cp = CircularProgress(
+                label="BMI",
+                value=progress_percent,
+                key="bmi_progress",
+                size="large",
+                color="rgb(255, 182, 193)",
+                track_color="rgb(222, 235, 245)",
+            )
+            cp.st_circular_progress()
+
+            st.markdown(f"<h1 style='text-align: center;'>{bmi_value} </h1>", unsafe_allow_html=True)
+            st.markdown(f"<p style='text-align: center;'>BMI Value </p>", unsafe_allow_html=True)
+
+            if bmi_value < 18.5:
+                st.info("UnderWeight")
+            elif 18.5 <= bmi_value < 25.0:
+                st.success("Healthy")
+            elif 25.0 <= bmi_value < 30.0:
+                st.warning("OverWeight")
+            else:
+                st.error("Obese")
+
+
+@timed("dashboard.patient_summary")
+def show_patient_summary(patient_id):
+    data = patient_views.summary(patient_id)
+    if data is None:
         st.error("Patient data not found.")
         return
 
-    data = pd.merge(info, history, on='patient_id')
-    data = pd.merge(data, records, on='patient_id')
-
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Personal Info")
-        st.markdown(f"Name: {data['name'].values[0]}")
-        st.markdown(f"Age: {data['age'].values[0]}")
-        st.markdown(f"Gender: {data['gender'].values[0]}")
-        st.markdown(f"Contact: {data['contact_info'].values[0]}")
-        st.markdown(f"Address: {data['address'].values[0]}")
-        st.markdown(f"Emergency Contact: {data['emergency_contact'].values[0]}")
+        st.markdown(f"Name: {data['name']}")
+        st.markdown(f"Age: {data['age']}")
+        st.markdown(f"Gender: {data['gender']}")
+        st.markdown(f"Contact: {data['contact_info']}")
+        st.markdown(f"Address: {data['address']}")
+        st.markdown(f"Emergency Contact: {data.get('emergency_contact', 'N/A')}")
 
     with col2:
         st.subheader("Health Report")
 
-        def flag(val, normal): return f"🔴 {val}" if val < normal[0] or val > normal[1] else f"🟢 {val}"
+        def flag(vital): return f"🔴 {data[vital]:g}" if data[f"{vital}_flag"] else f"🟢 {data[vital]:g}"
 
-        st.markdown(f"Systolic BP: {flag(data['blood_pressure_systolic'].values[0], (90, 140))} mmHg")
-        st.markdown(f"Diastolic BP: {flag(data['blood_pressure_diastolic'].values[0], (60, 90))} mmHg")
-        st.markdown(f"Heart Rate: {flag(data['heart_rate'].values[0], (60, 100))} bpm")
-        st.markdown(f"Blood Sugar: {flag(data['blood_sugar_level'].values[0], (70, 140))} mg/dL")
-        st.markdown(f"BMI: {flag(data['BMI'].values[0], (18.5, 24.9))}")
-        st.markdown(f"Conditions: {data['previous_medical_condition'].values[0]}")
-        st.markdown(f"Medications: {data['medications_used'].values[0]}")
+        st.markdown(f"Systolic BP: {flag('blood_pressure_systolic')} mmHg")
+        st.markdown(f"Diastolic BP: {flag('blood_pressure_diastolic')} mmHg")
+        st.markdown(f"Heart Rate: {flag('heart_rate')} bpm")
+        st.markdown(f"Blood Sugar: {flag('blood_sugar_level')} mg/dL")
+        st.markdown(f"BMI: {flag('BMI')}")
+        st.markdown(f"Conditions: {data['previous_medical_condition']}")
+        st.markdown(f"Medications: {data['medications_used']}")
 
     st.subheader("Risk Assessment")
-    risk = 0
-    if data['blood_pressure_systolic'].values[0] > 140: risk += 1
-    if data['blood_sugar_level'].values[0] > 180: risk += 1
-    if data['BMI'].values[0] > 30: risk += 1
-    if risk == 0:
+    if data['risk_level'] == "Low":
         st.success("🟢 Low Risk")
-    elif risk == 1:
+    elif data['risk_level'] == "Moderate":
         st.warning("🟡 Moderate Risk")
     else:
         st.error("🔴 High Risk")
 
 
+# One shared table for the latest data version, sorted once; cache_data would
+# keep one per version and hand every rerun its own deserialized copy
+@counted(st.cache_resource(max_entries=1))
+def cohort_risk(snapshot, data_version, model_path):
+    details_df, history_df, records_df = patient_index.cohort_tables()
+    risk_table = assess_cohort(details_df, history_df, records_df)
+    if model_path:
+        # One batched predict_proba call for the whole roster
+        scores = load_model(model_path).score_patients(details_df, records_df)
+        risk_table = risk_table.merge(scores.add_prefix('p_').rename(columns={'p_patient_id': 'patient_id'}),
+                                      on='patient_id', how='left')
+    return risk_table.sort_values('risk_score', ascending=False, kind='stable').reset_index(drop=True)
+
+
 st.divider()
 
 st.header("Medical History")
 
-st.table(history_df[history_df['patient_id'] == patient_id].drop(columns=['patient_id']).T.rename(
-    columns={history_df.columns[1]: 'Details'}))
+with span("dashboard.history"):
+    medical_history, medications = patient_views.history_tables(patient_id)
+    st.table(medical_history)
 
 st.divider()
 
 st.header("Current Medications")
 
-st.table(history_df[history_df['patient_id'] == patient_id].drop(columns=['previous_medical_condition']).drop(
-    columns=['patient_id']).T.rename(columns={history_df.columns[1]: 'Details'}))
+with span("dashboard.medications"):
+    st.table(medications)
 
 st.divider()
 
-review = st.text_area("Doctor's Review")
-if st.button("Submit Review"):
-    st.success("Review submitted successfully!")
+
+@st.fragment
+def doctors_review():
+    review = st.text_area("Doctor's Review")
+    if st.button("Submit Review"):
+        st.success("Review submitted successfully!")
+
+
+doctors_review()
 
 st.divider()
 st.header("Patient Summary")
 
-if st.button("Summarise"):
-    show_patient_summary(patient_id)
+
+@st.fragment
+def patient_summary(patient_id):
+    if st.button("Summarise"):
+        show_patient_summary(patient_id)
+
+
+patient_summary(patient_id)
+
+st.divider()
+st.header("Cohort Risk")
+
+
+@st.fragment
+@timed("dashboard.cohort_risk")
+def cohort_risk_table():
+    # A toggle rather than an expander: a collapsed expander still runs its body,
+    # which would assess the whole roster and load the risk model on every rerun
+    if not st.toggle("Risk assessment for all patients"):
+        return
+    risk_table = cohort_risk(snapshot, patient_index.version, latest_model_path())
+    levels = st.multiselect("Risk level", list(RISK_LEVELS), default=list(RISK_LEVELS))
+    if len(levels) < len(RISK_LEVELS):
+        risk_table = risk_table[risk_table['risk_level'].isin(levels)]
+    st.dataframe(risk_table, hide_index=True)
+    # The CSV is built when the button is clicked, not on every rerun
+    st.download_button("Export CSV", lambda: risk_table.to_csv(index=False), file_name="risk_assessment.csv",
+                       mime="text/csv")
+
+
+cohort_risk_table()
+
+
+@counted(st.cache_data)
+def get_base64_image(image_path):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode()
+
+
+# The background is only styling, so it is embedded after every section has
+# been sent rather than ahead of the data
+with span("dashboard.background"):
+    base64_image_string = get_base64_image(os.path.join(ASSET_DIR, "bg.jpg"))
+
+    st.markdown(
+        f"""
+            <style>
+            .stApp {{
+                background-image: url("data:image/jpeg;base64,{base64_image_string}");
+                background-size: cover;
+                background-repeat: no-repeat;
+                background-attachment: fixed;
+                background-position: center center;
+            }}
+
+            [data-testid="stSidebar"] > div:first-child {{
+                background-color: transparent;
+            }}
+            </style>
+            """,
+        unsafe_allow_html=True
+    )
+
+rerun.stop()
+telemetry.export()
+telemetry.admin_panel()
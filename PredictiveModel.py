@@ -5,13 +5,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import datetime
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LinearRegression
 import warnings
+from downsample import downsample
+from trend_forecast import fit_trends
+from risk_model import load_latest_model
+import telemetry
+from telemetry import counted, span, timed
 
 warnings.filterwarnings('ignore')
 
@@ -51,6 +51,27 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@counted(st.cache_data)
+def sample_history(today):
+    """Seeded 7-day history ending today, built once per day rather than per rerun"""
+    dates = pd.date_range(end=today, periods=7)
+
+    # Create realistic variations in health metrics
+    np.random.seed(42)
+
+    return pd.DataFrame({
+        'date': dates,
+        'heart_rate': np.random.normal(72, 3, 7).astype(int),
+        'systolic_bp': np.random.normal(120, 5, 7).astype(int),
+        'diastolic_bp': np.random.normal(80, 3, 7).astype(int),
+        'blood_sugar': np.random.normal(95, 8, 7).astype(int),
+        'weight': np.random.normal(75, 0.5, 7).round(1),
+        'daily_steps': np.random.normal(8500, 1000, 7).astype(int),
+        'sleep_hours': np.random.normal(7.2, 0.5, 7).round(1),
+        'hydration_glasses': np.random.randint(5, 9, 7)
+    })
+
+
 class HealthDashboard:
     def __init__(self):
         self.initialize_session_state()
@@ -83,22 +104,7 @@ class HealthDashboard:
 
     def generate_sample_data(self):
         """Generate sample historical data"""
-        dates = pd.date_range(end=datetime.date.today(), periods=7)
-
-        # Create realistic variations in health metrics
-        np.random.seed(42)
-
-        self.historical_data = pd.DataFrame({
-            'date': dates,
-            'heart_rate': np.random.normal(72, 3, 7).astype(int),
-            'systolic_bp': np.random.normal(120, 5, 7).astype(int),
-            'diastolic_bp': np.random.normal(80, 3, 7).astype(int),
-            'blood_sugar': np.random.normal(95, 8, 7).astype(int),
-            'weight': np.random.normal(75, 0.5, 7).round(1),
-            'daily_steps': np.random.normal(8500, 1000, 7).astype(int),
-            'sleep_hours': np.random.normal(7.2, 0.5, 7).round(1),
-            'hydration_glasses': np.random.randint(5, 9, 7)
-        })
+        self.historical_data = sample_history(datetime.date.today())
 
     def calculate_bmi(self):
         """Calculate BMI"""
@@ -106,6 +112,25 @@ class HealthDashboard:
         height_m = profile['height'] / 100
         return round(profile['weight'] / (height_m ** 2), 1)
 
+    def predict_conditions(self):
+        """Condition probabilities from the trained risk model, or None if none is trained"""
+        model = load_latest_model()
+        if model is None:
+            return None
+
+        profile = st.session_state.user_profile
+        metrics = st.session_state.current_metrics
+        features = pd.DataFrame([{
+            'age': profile['age'],
+            'gender': profile['gender'],
+            'blood_pressure_systolic': metrics['systolic_bp'],
+            'blood_pressure_diastolic': metrics['diastolic_bp'],
+            'heart_rate': metrics['heart_rate'],
+            'blood_sugar_level': metrics['blood_sugar'],
+            'BMI': self.calculate_bmi(),
+        }])
+        return model.predict_proba(features).iloc[0].to_dict()
+
     def calculate_risk_scores(self):
         """Calculate health risk scores using simple ML logic"""
         profile = st.session_state.user_profile
@@ -143,18 +168,10 @@ class HealthDashboard:
 
     def generate_predictions(self):
         """Generate 30-day health predictions"""
-        # Simple linear regression for trend prediction
-        X = np.arange(7).reshape(-1, 1)
-
-        # Heart rate prediction
-        hr_model = LinearRegression()
-        hr_model.fit(X, self.historical_data['heart_rate'].values)
-        future_hr = hr_model.predict([[30]])[0]
-
-        # Weight prediction
-        weight_model = LinearRegression()
-        weight_model.fit(X, self.historical_data['weight'].values)
-        future_weight = weight_model.predict([[30]])[0]
+        # Closed-form least-squares trend for both metrics, extrapolated to day 30
+        X = np.arange(7)
+        slope, intercept = fit_trends(X, self.historical_data[['heart_rate', 'weight']].values)
+        future_hr, future_weight = intercept[0] + slope[0] * 30
 
         # Health score calculation (0-100)
         current_health_score = self.calculate_health_score()
@@ -256,6 +273,8 @@ class HealthDashboard:
 
     def create_risk_gauge(self, title, score, color):
         """Create a risk assessment gauge"""
+        import plotly.graph_objects as go
+
         fig = go.Figure(go.Indicator(
             mode="gauge+number+delta",
             value=score,
@@ -281,11 +300,15 @@ class HealthDashboard:
         return fig
 
 
+@timed("predictive.rerun")
 def main():
-    dashboard = HealthDashboard()
+    # One dashboard per session; reruns reuse it instead of rebuilding it
+    if 'dashboard' not in st.session_state:
+        st.session_state.dashboard = HealthDashboard()
+    dashboard = st.session_state.dashboard
 
     # Sidebar for navigation and user profile
-    with st.sidebar:
+    with span("predictive.sidebar"), st.sidebar:
         st.markdown("## 👤 User Profile")
 
         profile = st.session_state.user_profile
@@ -308,6 +331,8 @@ def main():
         st.markdown("Navigation")
         page = st.radio("Go to", ["Overview", "Health Trends", "AI Predictions", "Recommendations"])
 
+    page_span = span("predictive." + page.lower().replace(" ", "_")).start()
+
     # Main header
     st.markdown(f"<h1 class='main-header'> Smart Health Dashboard - {name}</h1>",
                 unsafe_allow_html=True)
@@ -383,11 +408,16 @@ def main():
 
     # Health Trends Page
     elif page == "Health Trends":
+        # Plotly is imported by the first page that draws a figure, not at startup
+        import plotly.express as px
+        import plotly.graph_objects as go
+
         st.markdown("7-Day Health Trends")
 
         # Heart Rate Trend
         st.markdown("### Heart Rate Trend")
-        fig_hr = px.line(dashboard.historical_data, x='date', y='heart_rate',
+        hr_trend = downsample(dashboard.historical_data, x='date', columns=['heart_rate'])
+        fig_hr = px.line(hr_trend, x='date', y='heart_rate',
                          title='Heart Rate Over Time',
                          labels={'heart_rate': 'Heart Rate (bpm)', 'date': 'Date'})
         fig_hr.update_traces(line_color='red')
@@ -398,19 +428,21 @@ def main():
 
         with col1:
             st.markdown("### Blood Pressure Trend")
+            bp_trend = downsample(dashboard.historical_data, x='date', columns=['systolic_bp', 'diastolic_bp'])
             fig_bp = go.Figure()
-            fig_bp.add_trace(go.Scatter(x=dashboard.historical_data['date'],
-                                        y=dashboard.historical_data['systolic_bp'],
+            fig_bp.add_trace(go.Scatter(x=bp_trend['date'],
+                                        y=bp_trend['systolic_bp'],
                                         mode='lines+markers', name='Systolic', line=dict(color='blue')))
-            fig_bp.add_trace(go.Scatter(x=dashboard.historical_data['date'],
-                                        y=dashboard.historical_data['diastolic_bp'],
+            fig_bp.add_trace(go.Scatter(x=bp_trend['date'],
+                                        y=bp_trend['diastolic_bp'],
                                         mode='lines+markers', name='Diastolic', line=dict(color='green')))
             fig_bp.update_layout(title='Blood Pressure Trend', xaxis_title='Date', yaxis_title='mmHg')
             st.plotly_chart(fig_bp, use_container_width=True)
 
         with col2:
             st.markdown("### Blood Sugar Trend")
-            fig_bs = px.line(dashboard.historical_data, x='date', y='blood_sugar',
+            bs_trend = downsample(dashboard.historical_data, x='date', columns=['blood_sugar'])
+            fig_bs = px.line(bs_trend, x='date', y='blood_sugar',
                              title='Blood Sugar Trend',
                              labels={'blood_sugar': 'Blood Sugar (mg/dL)', 'date': 'Date'})
             fig_bs.update_traces(line_color='purple')
@@ -421,7 +453,8 @@ def main():
 
         with col3:
             st.markdown("### Weight Trend")
-            fig_weight = px.bar(dashboard.historical_data, x='date', y='weight',
+            weight_trend = downsample(dashboard.historical_data, x='date', columns=['weight'], method='minmax')
+            fig_weight = px.bar(weight_trend, x='date', y='weight',
                                 title='Weight Trend',
                                 labels={'weight': 'Weight (kg)', 'date': 'Date'})
             fig_weight.update_traces(marker_color='green')
@@ -429,7 +462,8 @@ def main():
 
         with col4:
             st.markdown("### Daily Steps")
-            fig_steps = px.area(dashboard.historical_data, x='date', y='daily_steps',
+            steps_trend = downsample(dashboard.historical_data, x='date', columns=['daily_steps'])
+            fig_steps = px.area(steps_trend, x='date', y='daily_steps',
                                 title='Daily Steps Trend',
                                 labels={'daily_steps': 'Steps', 'date': 'Date'})
             fig_steps.update_traces(fill='tonexty', fillcolor='rgba(0,176,246,0.2)')
@@ -460,6 +494,14 @@ def main():
                                                            risk_scores['hypertension'], "purple")
             st.plotly_chart(fig_hypertension, use_container_width=True)
 
+        condition_risk = dashboard.predict_conditions()
+        if condition_risk:
+            st.markdown("### Model-Estimated Condition Risk")
+            columns = st.columns(len(condition_risk))
+            for column, (condition, probability) in zip(columns, condition_risk.items()):
+                with column:
+                    st.metric(condition, f"{probability:.0%}")
+
         # 30-Day Predictions
         st.markdown("### 30-Day Health Forecast")
         predictions = dashboard.generate_predictions()
@@ -564,6 +606,10 @@ def main():
             st.error("🧂 **Sodium**: Limit sodium intake to <2300mg per day")
             st.error("🍌 **Potassium**: Increase potassium-rich foods (bananas, spinach)")
 
+    page_span.stop()
+
 
 if __name__ == "__main__":
     main()
+    telemetry.export()
+    telemetry.admin_panel()
@@ -0,0 +1,106 @@
+# Sai
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from patient_data import patient_offsets
+from risk_assessment import NORMAL_RANGES
+
+VITAL_LABELS = {
+    'blood_pressure_systolic': "Systolic BP",
+    'blood_pressure_diastolic': "Diastolic BP",
+    'heart_rate': "Heart Rate",
+    'blood_sugar_level': "Blood Sugar",
+    'BMI': "BMI",
+}
+
+
+def evaluate_alerts(records_df, ranges=NORMAL_RANGES):
+    """One alert row per reading and vital outside its normal range.
+
+    All thresholds are checked over all rows in one vectorized pass; BMI is
+    derived per reading from weight and height. Alerts keep the order of
+    `records_df`, so a table sorted by patient yields alerts sorted by patient.
+    """
+    vitals = list(ranges)
+    columns = []
+    for vital in vitals:
+        if vital == 'BMI':
+            weight = records_df['weight'].to_numpy(dtype=np.float64)
+            height = records_df['height'].to_numpy(dtype=np.float64)
+            columns.append(np.round(weight / height ** 2, 2))
+        else:
+            columns.append(records_df[vital].to_numpy(dtype=np.float64))
+    values = np.column_stack(columns) if columns else np.empty((len(records_df), 0))
+    low = np.array([ranges[vital][0] for vital in vitals], dtype=np.float64)
+    high = np.array([ranges[vital][1] for vital in vitals], dtype=np.float64)
+
+    rows, positions = np.nonzero((values < low) | (values > high))
+    flagged = values[rows, positions]
+    return pd.DataFrame({
+        'patient_id': records_df['patient_id'].to_numpy()[rows],
+        'date_recorded': records_df['date_recorded'].to_numpy()[rows],
+        'vital': np.array(vitals, dtype=object)[positions],
+        'value': flagged,
+        'low': low[positions],
+        'high': high[positions],
+        'direction': np.where(flagged > high[positions], "High", "Low"),
+    })
+
+
+class AlertStore:
+    """Out-of-range readings for every patient, indexed by patient.
+
+    Thresholds are evaluated over all records once. After that the store
+    subscribes to the patient index and evaluates only the readings each ingest
+    appends, so alerts() never rescans a patient's history.
+    """
+
+    def __init__(self, patient_index, ranges=NORMAL_RANGES):
+        self.patient_index = patient_index
+        self.ranges = ranges
+        self._lock = threading.Lock()
+        self._build()
+        patient_index.subscribe(self._ingest)
+
+    def _build(self):
+        alerts = evaluate_alerts(self.patient_index.records_df, self.ranges)
+        with self._lock:
+            self._alerts = (alerts, patient_offsets(alerts['patient_id']))
+            self._appended = {}
+
+    def _ingest(self, new_records):
+        if new_records is None:
+            self._build()
+            return
+        new_alerts = evaluate_alerts(new_records, self.ranges)
+        with self._lock:
+            appended = dict(self._appended)
+            for patient_id, rows in new_alerts.groupby('patient_id', sort=False, observed=True):
+                previous = appended.get(patient_id)
+                appended[patient_id] = rows if previous is None else pd.concat([previous, rows])
+            self._appended = appended
+
+    def alerts(self, patient_id):
+        """Alerts for one patient, oldest reading first"""
+        alerts, offsets = self._alerts
+        start, stop = offsets.get(patient_id, (0, 0))
+        rows = alerts.iloc[start:stop]
+        appended = self._appended.get(patient_id)
+        if appended is not None:
+            rows = pd.concat([rows, appended]).sort_values('date_recorded', kind='stable')
+        return rows
+
+
+class PatientAlerts:
+    """Alerts evaluated from one patient's records on each read, for stores that are never loaded whole"""
+
+    def __init__(self, patient_store, ranges=NORMAL_RANGES):
+        self.patient_store = patient_store
+        self.ranges = ranges
+
+    def alerts(self, patient_id):
+        """Alerts for one patient, oldest reading first"""
+        return evaluate_alerts(self.patient_store.records(patient_id), self.ranges)
@@ -1,46 +1,574 @@
 # Sai
 
-############################################################################### UNDER CONSTRUCTION PLEASE IGNORE #############################################################################
+import argparse
+import functools
+import hashlib
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from multiprocessing import Pool
 
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-import matplotlib.pyplot as plt
-
-# Sample patient vitals (synthetic data)
-np.random.seed(42)
-bp = np.random.normal(120, 10, 200)   # blood pressure
-hr = np.random.normal(75, 8, 200)     # heart rate
-
-# Add anomalies
-bp = np.concatenate([bp, [200, 40, 180]])
-hr = np.concatenate([hr, [30, 190, 20]])
-
-data = pd.DataFrame({"BloodPressure": bp, "HeartRate": hr})
-
-# Isolation Forest
-model = IsolationForest(contamination=0.02, random_state=42)
-data["anomaly"] = model.fit_predict(data[["BloodPressure", "HeartRate"]])
-data["anomaly"] = data["anomaly"].map({1: "Normal", -1: "Anomaly"})
-
-# Plot
-plt.figure(figsize=(8,6))
-plt.scatter(
-    data[data["anomaly"]=="Normal"]["BloodPressure"],
-    data[data["anomaly"]=="Normal"]["HeartRate"],
-    c="blue", label="Normal", alpha=0.6
-)
-plt.scatter(
-    data[data["anomaly"]=="Anomaly"]["BloodPressure"],
-    data[data["anomaly"]=="Anomaly"]["HeartRate"],
-    c="red", label="Anomaly", marker="x", s=100
-)
-plt.xlabel("Blood Pressure")
-plt.ylabel("Heart Rate")
-plt.title("Anomaly Detection (Isolation Forest)")
-plt.legend()
-plt.show()
-
-# Print anomalies
-print("Detected anomalies:")
-print(data[data["anomaly"]=="Anomaly"])
+from numpy.lib.stride_tricks import sliding_window_view
+import pandas as pd
+
+from patient_data import COLUMNAR_DIR, PatientIndex, normalise_patient_ids
+from risk_model import MODEL_DIR, latest_model_path, write_artifact
+
+ANOMALY_POINTER = "ANOMALY_LATEST"
+PATIENT_ANOMALY_POINTER = "PATIENT_ANOMALY_LATEST"
+ANOMALY_FEATURES = ['blood_pressure_systolic', 'blood_pressure_diastolic', 'heart_rate', 'blood_sugar_level']
+
+# Patients with fewer readings get no model of their own and use the global one:
+# a forest fitted on a handful of readings cannot isolate anything
+MIN_PATIENT_READINGS = 50
+# Default memory cap for per-patient models held at once
+REGISTRY_CAP_BYTES = 256 * 1024 ** 2
+
+# First cascade stage: a reading is a candidate when any vital's robust z-score
+# against the patient's previous ROBUST_WINDOW readings exceeds ROBUST_THRESHOLD
+ROBUST_WINDOW = 20
+ROBUST_THRESHOLD = 3.5
+ROBUST_MIN_HISTORY = 3
+
+# Plots with more points than this draw the normal readings as hexbin density
+DENSITY_ABOVE = 50_000
+
+# Column layout of health_records.csv, assumed for streams without a header line
+RECORD_COLUMNS = [
+    'patient_id', 'date_recorded', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+    'heart_rate', 'blood_sugar_level', 'weight', 'height', 'respiratory_rate',
+]
+
+
+class AnomalyDetector:
+    """A fitted IsolationForest and the vitals it was fitted on"""
+
+    def __init__(self, estimator, features, version, metadata=None):
+        self.estimator = estimator
+        self.features = features
+        self.version = version
+        self.metadata = metadata or {}
+
+    def score(self, frame):
+        """Add anomaly_score (below 0 is anomalous) and anomaly columns to a copy of `frame`.
+
+        Rows missing any feature are left unscored: NaN score, not flagged.
+        """
+        frame = frame.copy()
+        values = frame[self.features].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values).any(axis=1)
+        scores = np.full(len(frame), np.nan)
+        if valid.any():
+            scores[valid] = self.estimator.decision_function(values[valid])
+        frame['anomaly_score'] = scores
+        frame['anomaly'] = scores < 0
+        return frame
+
+
+def fit_detector(records_df, features=ANOMALY_FEATURES, contamination=0.02, random_state=42):
+    """Fit one IsolationForest on every historical reading"""
+    from sklearn.ensemble import IsolationForest
+
+    values = records_df[features].dropna().to_numpy(dtype=np.float64)
+    estimator = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=-1)
+    estimator.fit(values)
+
+    digest = hashlib.sha256(values.tobytes()).hexdigest()
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+    metadata = {
+        'features': features,
+        'contamination': contamination,
+        'training_rows': len(values),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return AnomalyDetector(estimator, features, version, metadata)
+
+
+def save_detector(detector, directory=MODEL_DIR):
+    """Write a versioned artifact and point ANOMALY_LATEST at it"""
+    artifact = {'estimator': detector.estimator, 'features': detector.features,
+                'version': detector.version, 'metadata': detector.metadata}
+    return write_artifact(artifact, directory, f"anomaly_model-{detector.version}.joblib", ANOMALY_POINTER)
+
+
+@functools.lru_cache(maxsize=2)
+def load_detector(path):
+    import joblib
+
+    return AnomalyDetector(**joblib.load(path))
+
+
+def load_latest_detector(directory=MODEL_DIR):
+    """The artifact ANOMALY_LATEST points at, or None before `fit` has run"""
+    path = latest_model_path(directory, ANOMALY_POINTER)
+    return load_detector(path) if path else None
+
+
+def _fit_patient_chunk(args):
+    directory, features, contamination, random_state, patients = args
+    from sklearn.ensemble import IsolationForest
+    import joblib
+
+    fitted = []
+    for number, patient_id, values in patients:
+        estimator = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=1)
+        estimator.fit(values)
+        filename = f"patient_{number}.joblib"
+        path = os.path.join(directory, filename)
+        joblib.dump({'estimator': estimator, 'features': features, 'version': patient_id,
+                     'metadata': {'training_rows': len(values)}}, path)
+        fitted.append((patient_id, filename, os.path.getsize(path)))
+    return fitted
+
+
+def fit_patient_detectors(records_df, directory=MODEL_DIR, features=ANOMALY_FEATURES, contamination=0.02,
+                          workers=None, chunk_size=None, random_state=42, min_readings=MIN_PATIENT_READINGS):
+    """Fit one IsolationForest per patient across a process pool and publish the set.
+
+    Each worker writes its models straight to disk, so only file names travel
+    back. The set lands in its own versioned directory with a manifest, and
+    PATIENT_ANOMALY_LATEST is repointed once every model is written. Returns
+    the published directory.
+    """
+    readings = records_df[['patient_id'] + features].dropna()
+    groups = [(patient_id, group[features].to_numpy(dtype=np.float64))
+              for patient_id, group in readings.groupby('patient_id', sort=False, observed=True)]
+    groups = [(number, patient_id, values) for number, (patient_id, values) in enumerate(groups)
+              if len(values) >= min_readings]
+
+    digest = hashlib.sha256(readings[features].to_numpy(dtype=np.float64).tobytes()).hexdigest()
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+    name = f"patient_anomaly-{version}"
+    staging = os.path.join(directory, name + ".tmp")
+    os.makedirs(staging, exist_ok=True)
+
+    workers = workers or os.cpu_count()
+    # A few chunks per worker keeps them all busy when patients' histories differ in length
+    chunk_size = chunk_size or max(1, -(-len(groups) // (workers * 4)))
+    patients = {}
+    chunks = ((staging, features, contamination, random_state, groups[start:start + chunk_size])
+              for start in range(0, len(groups), chunk_size))
+    with Pool(workers) as pool:
+        for fitted in pool.imap_unordered(_fit_patient_chunk, chunks):
+            for patient_id, filename, size in fitted:
+                patients[patient_id] = [filename, size]
+
+    manifest = {'version': version, 'features': features, 'contamination': contamination,
+                'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'patients': patients}
+    with open(os.path.join(staging, "manifest.json"), "w") as file:
+        json.dump(manifest, file)
+    os.replace(staging, os.path.join(directory, name))
+
+    pointer = os.path.join(directory, PATIENT_ANOMALY_POINTER)
+    with open(pointer + ".tmp", "w") as file:
+        file.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    return os.path.join(directory, name)
+
+
+class PatientDetectorRegistry:
+    """Per-patient detectors, loaded on first use and evicted least recently used first.
+
+    Models stay on disk until a patient's readings need scoring. The artifact
+    size stands in for a model's memory, and models are dropped once the
+    loaded total exceeds `memory_cap` bytes. Patients without a model of their
+    own are scored by `fallback` (or left unscored when it is None).
+    """
+
+    def __init__(self, directory, memory_cap=REGISTRY_CAP_BYTES, fallback=None):
+        with open(os.path.join(directory, "manifest.json")) as file:
+            manifest = json.load(file)
+        self.directory = directory
+        self.version = manifest['version']
+        self.features = manifest['features']
+        self.memory_cap = memory_cap
+        self.fallback = fallback
+        self._files = manifest['patients']
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = self.loads = self.evictions = 0
+
+    def __contains__(self, patient_id):
+        return patient_id in self._files
+
+    def get(self, patient_id):
+        """The patient's detector, the fallback, or None"""
+        with self._lock:
+            detector = self._loaded.get(patient_id)
+            if detector is not None:
+                self._loaded.move_to_end(patient_id)
+                self.hits += 1
+                return detector
+        entry = self._files.get(patient_id)
+        if entry is None:
+            return self.fallback
+
+        import joblib
+
+        filename, size = entry
+        detector = AnomalyDetector(**joblib.load(os.path.join(self.directory, filename)))
+        with self._lock:
+            if patient_id not in self._loaded:
+                self._loaded[patient_id] = detector
+                self.resident_bytes += size
+                self.loads += 1
+            while self.resident_bytes > self.memory_cap and len(self._loaded) > 1:
+                evicted, _ = self._loaded.popitem(last=False)
+                self.resident_bytes -= self._files[evicted][1]
+                self.evictions += 1
+        return detector
+
+    def score(self, frame):
+        """Score every row with its own patient's detector; same columns as AnomalyDetector.score"""
+        parts = []
+        for patient_id, group in frame.groupby('patient_id', sort=False):
+            detector = self.get(patient_id)
+            if detector is None:
+                group = group.assign(anomaly_score=np.nan, anomaly=False)
+            else:
+                group = detector.score(group)
+            parts.append(group)
+        if not parts:
+            return frame.assign(anomaly_score=np.nan, anomaly=False)
+        return pd.concat(parts).loc[frame.index]
+
+    def stats(self):
+        return {'models': len(self._files), 'loaded': len(self._loaded), 'resident_bytes': self.resident_bytes,
+                'hits': self.hits, 'loads': self.loads, 'evictions': self.evictions}
+
+
+def load_latest_registry(directory=MODEL_DIR, memory_cap=REGISTRY_CAP_BYTES, fallback=None):
+    """A registry over the set PATIENT_ANOMALY_LATEST points at, or `fallback` before `fit --per-patient`"""
+    path = latest_model_path(directory, PATIENT_ANOMALY_POINTER)
+    return PatientDetectorRegistry(path, memory_cap, fallback) if path else fallback
+
+
+def robust_zscores(records_df, vitals=ANOMALY_FEATURES, window=ROBUST_WINDOW, min_history=ROBUST_MIN_HISTORY,
+                   chunk_rows=50_000):
+    """Robust z-score of every reading against the same patient's previous readings.
+
+    Uses the median and MAD of up to `window` earlier readings, found for all
+    rows at once from sliding windows masked at patient boundaries. Records
+    must be grouped by patient in date order, as PatientIndex keeps them.
+    Readings with fewer than `min_history` earlier ones, or a zero MAD, are
+    scored against the whole population's median and MAD instead. Returns a
+    (rows x vitals) array; NaN where the reading itself is missing.
+    """
+    codes = pd.factorize(records_df['patient_id'])[0]
+    values = records_df[vitals].to_numpy(dtype=np.float64)
+    padded_codes = np.concatenate([np.full(window, -1), codes])
+    # One contiguous float32 row per vital: unit-stride windows and half the
+    # memory traffic through the sorts, ample precision for a z-score
+    padded_values = np.ascontiguousarray(np.vstack([np.full((window, len(vitals)), np.nan), values]).T,
+                                         dtype=np.float32)
+
+    population_median = np.nanmedian(values, axis=0)
+    population_mad = np.nanmedian(np.abs(values - population_median), axis=0)
+    population_mad[population_mad == 0] = 1.0
+
+    z = np.empty_like(values)
+    for start in range(0, len(values), chunk_rows):
+        stop = min(start + chunk_rows, len(values))
+        rows = np.arange(stop - start)
+        # Row i's window is padded rows i .. i + window - 1, i.e. its `window` predecessors
+        same_patient = sliding_window_view(padded_codes[start:stop + window - 1], window) == codes[start:stop, None]
+        for column in range(len(vitals)):
+            ordered = sliding_window_view(padded_values[column, start:stop + window - 1], window).copy()
+            ordered[~same_patient] = np.nan
+            # Missing earlier readings are left out of the history, not counted in it
+            count = (~np.isnan(ordered)).sum(axis=1)
+            low, high = np.maximum(count - 1, 0) // 2, count // 2
+            # Sorting puts the NaNs (other patients, missing readings) last, so
+            # the median of the first `count` entries sits at a known position
+            ordered.sort(axis=1)
+            median = (ordered[rows, low] + ordered[rows, high]) / 2
+            deviations = np.abs(ordered - median[:, None])
+            deviations.sort(axis=1)
+            mad = (deviations[rows, low] + deviations[rows, high]) / 2
+            sparse = (count < min_history) | ~(mad > 0)
+            median[sparse] = population_median[column]
+            mad[sparse] = population_mad[column]
+            z[start:stop, column] = 0.6745 * (values[start:stop, column] - median) / mad
+    return z
+
+
+def cascade(records_df, detector, threshold=ROBUST_THRESHOLD, window=ROBUST_WINDOW):
+    """Two-stage scoring: a cheap robust z-score filter, then the IsolationForest on its candidates.
+
+    Returns (scored frame, stage counts). The frame carries robust_z (the
+    largest absolute z across vitals) and candidate, plus anomaly_score and
+    anomaly as from AnomalyDetector.score; rows the first stage rejects are
+    left unscored and not flagged.
+    """
+    z = np.abs(robust_zscores(records_df, detector.features, window))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        robust_z = np.nanmax(z, axis=1)
+    candidate = robust_z > threshold
+
+    scored = records_df.assign(robust_z=robust_z, candidate=candidate, anomaly_score=np.nan, anomaly=False)
+    if candidate.any():
+        second = detector.score(records_df[candidate])
+        scored.loc[candidate, 'anomaly_score'] = second['anomaly_score'].to_numpy()
+        scored.loc[candidate, 'anomaly'] = second['anomaly'].to_numpy()
+
+    stages = {
+        'rows': len(scored),
+        'rejected_by_robust_z': int((~candidate).sum()),
+        'rejected_by_forest': int(candidate.sum() - scored['anomaly'].sum()),
+        'flagged': int(scored['anomaly'].sum()),
+    }
+    return scored, stages
+
+
+def benchmark_cascade(records_df, detector, threshold=ROBUST_THRESHOLD, window=ROBUST_WINDOW, baseline=True):
+    """Rows per second of the cascade, and of the forest over every row for comparison"""
+    timings = {}
+    started = time.perf_counter()
+    scored, stages = cascade(records_df, detector, threshold, window)
+    timings['cascade'] = time.perf_counter() - started
+
+    if baseline:
+        started = time.perf_counter()
+        detector.score(records_df)
+        timings['forest on every row'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fit_detector(records_df, detector.features, detector.metadata.get('contamination', 0.02)).score(records_df)
+        timings['fit_predict on every row'] = time.perf_counter() - started
+
+    rates = {name: len(records_df) / elapsed for name, elapsed in timings.items()}
+    return scored, stages, rates
+
+
+def plot_anomalies(scored, path, x='blood_pressure_systolic', y='heart_rate', density_above=DENSITY_ABOVE):
+    """Render scored readings to an image file with the non-interactive Agg backend.
+
+    Normal readings are drawn as points, or as hexbin density once there are
+    more than `density_above` of them, and anomalies are overlaid as red
+    crosses. Nothing is shown on screen, so this works without a display.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    normal = scored[~scored['anomaly']]
+    anomalies = scored[scored['anomaly']]
+
+    figure, axes = plt.subplots(figsize=(8, 6))
+    if len(normal) > density_above:
+        density = axes.hexbin(normal[x], normal[y], gridsize=80, bins='log', cmap='Blues', mincnt=1)
+        figure.colorbar(density, ax=axes, label="Normal readings (log count)")
+    else:
+        axes.scatter(normal[x], normal[y], c="blue", label="Normal", alpha=0.6, s=10)
+    axes.scatter(anomalies[x], anomalies[y], c="red", label="Anomaly", marker="x", s=60)
+    axes.set_xlabel(x.replace('_', ' ').title())
+    axes.set_ylabel(y.replace('_', ' ').title())
+    axes.set_title(f"Anomaly Detection (Isolation Forest), {len(anomalies)} of {len(scored)} flagged")
+    axes.legend(loc="upper right")
+    figure.savefig(path, dpi=120, bbox_inches="tight")
+    plt.close(figure)
+    return path
+
+
+def follow_lines(source, lines, follow=False, from_start=False, poll_interval=0.2):
+    """Feed complete lines from a file (or "-" for stdin) into the `lines` queue.
+
+    The first line of a file is its header and is always queued first. With
+    `follow`, the file is tailed like `tail -f`: reading starts at the current
+    end unless `from_start`, and a line is only queued once its newline has
+    been written. None is queued when the source is exhausted.
+    """
+    if source == "-":
+        for line in sys.stdin:
+            lines.put(line)
+        lines.put(None)
+        return
+
+    with open(source) as file:
+        lines.put(file.readline())
+        if follow and not from_start:
+            file.seek(0, os.SEEK_END)
+        pending = ""
+        while True:
+            chunk = file.readline()
+            if not chunk:
+                if not follow:
+                    break
+                time.sleep(poll_interval)
+                continue
+            pending += chunk
+            if pending.endswith("\n"):
+                lines.put(pending)
+                pending = ""
+        if pending:
+            lines.put(pending)
+    lines.put(None)
+
+
+def iter_batches(lines, batch_size=64, max_latency=0.5):
+    """Group queued lines into batches of at most `batch_size`.
+
+    A batch is handed on once it is full or `max_latency` seconds after its
+    first line arrived, so a slow stream still gets scored promptly.
+    """
+    while True:
+        line = lines.get()
+        if line is None:
+            return
+        batch = [line]
+        deadline = time.monotonic() + max_latency
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if line is None:
+                yield batch
+                return
+            batch.append(line)
+        yield batch
+
+
+def score_stream(detector, source, out, batch_size=64, max_latency=0.5, follow=False, from_start=False):
+    """Score readings from `source` batch by batch and append flagged rows to `out`.
+
+    The detector is fitted beforehand and never refitted here. Returns
+    (rows scored, rows flagged).
+    """
+    lines = queue.Queue(maxsize=batch_size * 64)
+    reader = threading.Thread(target=follow_lines, args=(source, lines, follow, from_start), daemon=True)
+    reader.start()
+
+    header = lines.get()
+    if header is None:
+        return 0, 0
+    names = header.strip().split(",")
+    lead = []
+    if not set(detector.features) <= set(names):
+        lead, names = [header], RECORD_COLUMNS
+
+    sink = sys.stdout if out == "-" else open(out, "a", newline="")
+    write_header = out == "-" or sink.tell() == 0
+    scored = flagged = 0
+    started = time.perf_counter()
+    try:
+        for batch in iter_batches(lines, batch_size, max_latency):
+            frame = normalise_patient_ids(pd.read_csv(io.StringIO("".join(lead + batch)), header=None, names=names))
+            lead = []
+            result = detector.score(frame)
+            hits = result[result['anomaly']]
+            if len(hits):
+                hits.to_csv(sink, header=write_header, index=False)
+                write_header = False
+                sink.flush()
+            scored += len(result)
+            flagged += len(hits)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+        elapsed = time.perf_counter() - started
+        print(f"Scored {scored} readings in {elapsed:.2f}s, flagged {flagged}", file=sys.stderr)
+    return scored, flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vital-sign anomaly detection with an IsolationForest")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit", help="fit on historical readings and save the model")
+    fit.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+    fit.add_argument("--contamination", type=float, default=0.02)
+    fit.add_argument("--out", default=MODEL_DIR, help="model directory")
+    fit.add_argument("--per-patient", action="store_true",
+                     help="also fit one model per patient from that patient's own history")
+    fit.add_argument("--workers", type=int, default=None, help="processes for --per-patient (default: all cores)")
+    fit.add_argument("--min-readings", type=int, default=MIN_PATIENT_READINGS,
+                     help="readings a patient needs for a model of their own with --per-patient")
+
+    stream = commands.add_parser("stream", help="score incoming readings with the saved model")
+    stream.add_argument("--source", default="-", help="CSV file, or - for stdin")
+    stream.add_argument("--follow", action="store_true", help="keep tailing the file for new lines")
+    stream.add_argument("--from-start", action="store_true", help="with --follow, score existing lines too")
+    stream.add_argument("--batch-size", type=int, default=64)
+    stream.add_argument("--max-latency-ms", type=float, default=500,
+                        help="longest a reading waits for its batch to fill")
+    stream.add_argument("--out", default="anomalies.csv", help="CSV the flagged rows are appended to, or -")
+    stream.add_argument("--models", default=MODEL_DIR, help="model directory")
+    stream.add_argument("--per-patient", action="store_true",
+                        help="score each reading with its patient's own model, the global one otherwise")
+    stream.add_argument("--cap-mb", type=float, default=REGISTRY_CAP_BYTES / 1024 ** 2,
+                        help="memory cap for per-patient models held at once")
+
+    cascade_parser = commands.add_parser("cascade", help="robust z-score filter, then the saved model")
+    cascade_parser.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+    cascade_parser.add_argument("--threshold", type=float, default=ROBUST_THRESHOLD)
+    cascade_parser.add_argument("--window", type=int, default=ROBUST_WINDOW)
+    cascade_parser.add_argument("--no-baseline", action="store_true",
+                                help="skip timing the forest over every row")
+    cascade_parser.add_argument("--out", default="anomalies.csv", help="CSV the flagged rows are written to")
+    cascade_parser.add_argument("--models", default=MODEL_DIR, help="model directory")
+    cascade_parser.add_argument("--plot", default="anomalies.png", help="image file the plot is written to")
+    cascade_parser.add_argument("--no-plot", action="store_true", help="skip plotting, for batch runs")
+    cascade_parser.add_argument("--x", default='blood_pressure_systolic', help="vital on the plot's x axis")
+    cascade_parser.add_argument("--y", default='heart_rate', help="vital on the plot's y axis")
+    cascade_parser.add_argument("--density-above", type=int, default=DENSITY_ABOVE,
+                                help="draw normal readings as hexbin density above this many points")
+
+    args = parser.parse_args()
+    if args.command == "cascade":
+        detector = load_latest_detector(args.models)
+        if detector is None:
+            parser.error(f"no anomaly model in {args.models}/, run `python anomaly_detection.py fit` first")
+        records_df = PatientIndex.load(args.store).records_df
+        scored, stages, rates = benchmark_cascade(records_df, detector, args.threshold, args.window,
+                                                  baseline=not args.no_baseline)
+        scored[scored['anomaly']].to_csv(args.out, index=False)
+        print(f"{stages['rows']} readings")
+        print(f"  robust z-score rejected {stages['rejected_by_robust_z']}")
+        print(f"  IsolationForest rejected {stages['rejected_by_forest']}")
+        print(f"  flagged {stages['flagged']}, written to {args.out}")
+        for name, rate in rates.items():
+            print(f"{name}: {rate:,.0f} rows/s")
+        if not args.no_plot:
+            print(f"Plot written to {plot_anomalies(scored, args.plot, args.x, args.y, args.density_above)}")
+    elif args.command == "fit":
+        records_df = PatientIndex.load(args.store).records_df
+        detector = fit_detector(records_df, contamination=args.contamination)
+        path = save_detector(detector, args.out)
+        print(f"Fitted on {detector.metadata['training_rows']} readings of {', '.join(detector.features)}")
+        print(f"Saved {path}")
+        if args.per_patient:
+            started = time.perf_counter()
+            path = fit_patient_detectors(records_df, args.out, contamination=args.contamination, workers=args.workers,
+                                         min_readings=args.min_readings)
+            registry = PatientDetectorRegistry(path)
+            print(f"Fitted {registry.stats()['models']} patient models in {time.perf_counter() - started:.2f}s")
+            print(f"Saved {path}")
+    else:
+        detector = load_latest_detector(args.models)
+        if args.per_patient:
+            detector = load_latest_registry(args.models, int(args.cap_mb * 1024 ** 2), fallback=detector)
+        if detector is None:
+            parser.error(f"no anomaly model in {args.models}/, run `python anomaly_detection.py fit` first")
+        score_stream(detector, args.source, args.out, args.batch_size, args.max_latency_ms / 1000,
+                     args.follow, args.from_start)
+        if isinstance(detector, PatientDetectorRegistry):
+            print(f"Patient models: {detector.stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
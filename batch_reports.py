@@ -0,0 +1,149 @@
+# Sai
+
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import pandas as pd
+from pandas.api.types import is_scalar
+
+from patient_data import COLUMNAR_DIR, PatientIndex
+from risk_assessment import assess_cohort
+
+RISK_ICONS = {"Low": "🟢", "Moderate": "🟡", "High": "🔴"}
+
+# (label, vital, unit) in the order the dashboard's Health Report shows them
+REPORT_VITALS = [
+    ("Systolic BP", 'blood_pressure_systolic', " mmHg"),
+    ("Diastolic BP", 'blood_pressure_diastolic', " mmHg"),
+    ("Heart Rate", 'heart_rate', " bpm"),
+    ("Blood Sugar", 'blood_sugar_level', " mg/dL"),
+    ("BMI", 'BMI', ""),
+]
+
+
+def render_markdown(row):
+    """The show_patient_summary content for one row of the cohort risk table"""
+    lines = [
+        f"# Patient {row['patient_id']}",
+        "",
+        "## Personal Info",
+        f"- Name: {row['name']}",
+        f"- Age: {row['age']}",
+        f"- Gender: {row['gender']}",
+        f"- Contact: {row['contact_info']}",
+        f"- Address: {row['address']}",
+        f"- Emergency Contact: {row.get('emergency_contact', 'N/A')}",
+        "",
+        f"## Health Report ({row['date_recorded']})",
+    ]
+    for label, vital, unit in REPORT_VITALS:
+        icon = "🔴" if row[f"{vital}_flag"] else "🟢"
+        lines.append(f"- {label}: {icon} {row[vital]:g}{unit}")
+    lines += [
+        f"- Conditions: {row['previous_medical_condition']}",
+        f"- Medications: {row['medications_used']}",
+        "",
+        "## Risk Assessment",
+        f"{RISK_ICONS[row['risk_level']]} {row['risk_level']} Risk",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def render_json(row):
+    """One jsonl line; missing values are written as null, since a bare NaN is not valid JSON"""
+    row = {key: None if is_scalar(value) and pd.isna(value) else value for key, value in row.items()}
+    return json.dumps(row, default=str, ensure_ascii=False, allow_nan=False)
+
+
+# The patient index, handed to each worker once when the pool starts; forked
+# workers share its pages with the parent instead of receiving a copy per chunk
+_index = None
+
+
+def _use_index(index):
+    global _index
+    _index = index
+
+
+def _render_chunk(args):
+    renderer, patient_ids = args
+    render = render_json if renderer == "jsonl" else render_markdown
+    table = assess_cohort(*_index.tables_for(patient_ids))
+    return [(row['patient_id'], render(row)) for row in table.to_dict('records')]
+
+
+def iter_chunks(patient_ids, chunk_size):
+    for start in range(0, len(patient_ids), chunk_size):
+        yield patient_ids[start:start + chunk_size]
+
+
+def write_reports(index, patient_ids=None, out="reports", fmt="md", workers=None, chunk_size=500):
+    """Assess and render summaries across a process pool and write each chunk as it completes.
+
+    Workers assess one chunk of patients at a time, so no process holds the
+    risk table for the whole roster. Markdown goes to one file per patient
+    under `out`; jsonl streams every patient into the single file `out`.
+    Returns the number of reports written.
+    """
+    if patient_ids is None:
+        patient_ids = index.patient_ids()
+
+    if fmt == "md":
+        os.makedirs(out, exist_ok=True)
+        sink = None
+    else:
+        sink = open(out, "w", encoding="utf-8")
+
+    written = 0
+    try:
+        with Pool(workers, initializer=_use_index, initargs=(index,)) as pool:
+            chunks = ((fmt, chunk) for chunk in iter_chunks(patient_ids, chunk_size))
+            for reports in pool.imap(_render_chunk, chunks):
+                for patient_id, report in reports:
+                    if sink is None:
+                        with open(os.path.join(out, f"patient_{patient_id}.md"), "w", encoding="utf-8") as file:
+                            file.write(report)
+                    else:
+                        sink.write(report + "\n")
+                written += len(reports)
+    finally:
+        if sink is not None:
+            sink.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write patient summary reports without Streamlit")
+    parser.add_argument("patients", nargs="*", help="patient ids (default: every patient)")
+    parser.add_argument("--patients-file", help="file with one patient id per line")
+    parser.add_argument("--format", choices=["md", "jsonl"], default="md")
+    parser.add_argument("--out", help="output directory for md, output file for jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+    args = parser.parse_args()
+
+    patient_ids = [pid.strip() for pid in args.patients]
+    if args.patients_file:
+        with open(args.patients_file) as file:
+            patient_ids += [line.strip() for line in file if line.strip()]
+
+    index = PatientIndex.load(args.store)
+    if patient_ids:
+        missing = [pid for pid in patient_ids if pid not in index]
+        if missing:
+            print(f"Skipping unknown patients: {', '.join(missing)}")
+        patient_ids = [pid for pid in dict.fromkeys(patient_ids) if pid in index]
+        if not patient_ids:
+            parser.error("none of the requested patients exist")
+
+    out = args.out or ("reports" if args.format == "md" else "reports.jsonl")
+    written = write_reports(index, patient_ids or None, out, args.format, args.workers, args.chunk_size)
+    print(f"Wrote {written} reports to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# Sai
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from patient_data import DETAILS_CSV, HISTORY_CSV, RECORDS_CSV, PatientIndex, write_columnar_store
+from rollups import RollupStore, build_rollup
+from risk_assessment import assess_cohort, latest_readings
+from health_scoring import score_batch
+from synthetic_data import generate
+
+# Patients sampled for the per-patient benchmarks
+LOOKUP_SAMPLE = 1000
+# Profiles pushed through the scalar HealthDashboard methods one at a time
+SCALAR_PROFILES = 500
+
+
+class BenchmarkRun:
+    """Collects best-of-`repeat` timings as machine-readable result rows"""
+
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.results = []
+
+    def time(self, name, function, ops=1, rows=None, repeat=None):
+        best = float("inf")
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - started)
+
+        entry = {'name': name, 'seconds': best, 'ops': ops, 'us_per_op': best / ops * 1e6}
+        if rows:
+            entry['rows_per_s'] = rows / best
+        self.results.append(entry)
+        print(f"{name:<42} {best * 1000:12.2f} ms  {entry['us_per_op']:12.1f} us/op", file=sys.stderr)
+        return result
+
+
+def dashboard_profiles(index, seed=42):
+    """HealthDashboard-shaped profiles built from each patient's latest reading"""
+    latest = index.details_df[['patient_id', 'age', 'gender']].merge(latest_readings(index.records_df),
+                                                                     on='patient_id')
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'age': latest['age'].to_numpy(),
+        'gender': latest['gender'].to_numpy(),
+        'height': latest['height'].to_numpy(dtype=np.float64) * 100,
+        'weight': latest['weight'].to_numpy(dtype=np.float64),
+        'heart_rate': latest['heart_rate'].to_numpy(),
+        'systolic_bp': latest['blood_pressure_systolic'].to_numpy(),
+        'diastolic_bp': latest['blood_pressure_diastolic'].to_numpy(),
+        'blood_sugar': latest['blood_sugar_level'].to_numpy(),
+        'daily_steps': rng.integers(2000, 15000, len(latest)),
+        'sleep_hours': rng.normal(7.2, 1.0, len(latest)).round(1),
+        'hydration_glasses': rng.integers(3, 12, len(latest)),
+    })
+
+
+def bench_predictive_model(run, profiles):
+    """The PredictiveModel.py scoring methods, per profile, and score_batch over all profiles"""
+    import streamlit as st
+    from streamlit.logger import set_log_level
+    import PredictiveModel
+    from risk_model import load_latest_model
+
+    # Outside `streamlit run` every st call logs a bare-mode warning
+    set_log_level("error")
+
+    dashboard = PredictiveModel.HealthDashboard()
+    sample = profiles.head(SCALAR_PROFILES).to_dict('records')
+
+    def use_profile(profile):
+        st.session_state.user_profile = {'age': profile['age'], 'gender': profile['gender'],
+                                         'height': profile['height'], 'weight': profile['weight']}
+        st.session_state.current_metrics = profile
+
+    def score_each():
+        for profile in sample:
+            use_profile(profile)
+            dashboard.calculate_bmi()
+            dashboard.calculate_risk_scores()
+            dashboard.calculate_health_score()
+            dashboard.generate_recommendations()
+
+    # Model inference is timed on its own so it does not hide in the rule-based scoring
+    def predict_each():
+        for profile in sample:
+            use_profile(profile)
+            dashboard.predict_conditions()
+
+    run.time("predictive_model.scalar_scoring", score_each, ops=len(sample))
+    if load_latest_model() is not None:
+        run.time("predictive_model.predict_conditions", predict_each, ops=len(sample))
+    run.time("predictive_model.generate_predictions", dashboard.generate_predictions)
+    run.time("predictive_model.score_batch", lambda: score_batch(profiles), ops=len(profiles), rows=len(profiles))
+
+
+def run_benchmarks(data_dir, repeat=3, seed=42):
+    paths = {name: os.path.join(data_dir, name) for name in (DETAILS_CSV, HISTORY_CSV, RECORDS_CSV)}
+    run = BenchmarkRun(repeat)
+
+    index = run.time("load_summary_data.csv",
+                     lambda: PatientIndex.from_csv(paths[DETAILS_CSV], paths[HISTORY_CSV], paths[RECORDS_CSV]))
+    records = len(index.records_df)
+
+    with tempfile.TemporaryDirectory() as columnar:
+        run.time("columnar.convert", lambda: write_columnar_store(
+            index.details_df, index.history_df, index.records_df, index.records_offset, columnar), repeat=1)
+        run.time("load_summary_data.columnar",
+                 lambda: PatientIndex.from_columnar(columnar, records_path=paths[RECORDS_CSV]))
+
+    patient_ids = index.patient_ids()
+    rng = np.random.default_rng(seed)
+    sample = [patient_ids[i] for i in rng.integers(0, len(patient_ids), min(LOOKUP_SAMPLE, len(patient_ids)))]
+
+    def lookup():
+        for patient_id in sample:
+            index.details(patient_id)
+            index.history(patient_id)
+            index.records(patient_id)
+
+    run.time("patient_lookup", lookup, ops=len(sample))
+    run.time("daily_aggregation.all_patients", lambda: build_rollup(index.records_df, 'D'), rows=records)
+    rollups = run.time("daily_aggregation.store_build", lambda: RollupStore(index), rows=records, repeat=1)
+    run.time("daily_aggregation.patient", lambda: [rollups.rollup(patient_id, 'D') for patient_id in sample],
+             ops=len(sample))
+
+    def summaries():
+        for patient_id in sample:
+            assess_cohort(index.details(patient_id), index.history(patient_id), index.records(patient_id))
+
+    run.time("show_patient_summary", summaries, ops=len(sample))
+    run.time("cohort_risk", lambda: assess_cohort(index.details_df, index.history_df, index.records_df),
+             rows=records)
+
+    bench_predictive_model(run, dashboard_profiles(index, seed))
+
+    meta = {
+        'records': records,
+        'patients': len(patient_ids),
+        'repeat': repeat,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    return {'meta': meta, 'results': run.results}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous, tolerance):
+    """Print the slowdown of each benchmark against a previous run; returns the regressed names"""
+    before = {entry['name']: entry['us_per_op'] for entry in previous['results']}
+    regressed = []
+    for entry in current['results']:
+        if entry['name'] not in before:
+            continue
+        ratio = entry['us_per_op'] / before[entry['name']]
+        marker = "  REGRESSION" if ratio > tolerance else ""
+        print(f"{entry['name']:<42} {ratio:6.2f}x{marker}", file=sys.stderr)
+        if ratio > tolerance:
+            regressed.append(entry['name'])
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the DiagnoGraph data paths on synthetic data")
+    parser.add_argument("--records", type=int, default=100_000, help="records to generate when --data is not given")
+    parser.add_argument("--data", help="directory with the three CSV files, e.g. from synthetic_data.py")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the best is kept")
+    parser.add_argument("--out", default="-", help="JSON results file, or - for stdout")
+    parser.add_argument("--compare", help="previous JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    if args.data:
+        report = run_benchmarks(args.data, args.repeat, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            generate(data_dir, args.records, seed=args.seed)
+            report = run_benchmarks(data_dir, args.repeat, args.seed)
+
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressed = compare(report, json.load(file), args.tolerance)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Sai
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on points sent to the browser per chart
+MAX_CHART_POINTS = int(os.environ.get("DIAGNOGRAPH_MAX_CHART_POINTS", 2000))
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: positions of `threshold` points that keep the series' shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept; the rest are split into buckets
+    # and each bucket keeps the point forming the largest triangle with the
+    # previously kept point and the average of the next bucket
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """Min/max bucketing: the lowest and highest point of each bucket, so no spike is dropped"""
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(np.int64)
+    selected = [0, n - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            selected.append(start + int(np.argmin(y[start:stop])))
+            selected.append(start + int(np.argmax(y[start:stop])))
+    return np.unique(selected)
+
+
+def _numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        values = values.astype('int64')
+    return values.to_numpy(dtype=np.float64)
+
+
+def downsample(df, budget=None, x=None, columns=None, method='lttb'):
+    """Keep at most `budget` rows of a chart frame while preserving peaks.
+
+    The x values come from column `x`, or the index when it is None. Each plotted
+    column gets an equal share of the budget and the union of the rows picked
+    for every column is returned, in the original order.
+    """
+    budget = MAX_CHART_POINTS if budget is None else budget
+    if len(df) <= budget:
+        return df
+
+    columns = [column for column in (columns or df.columns) if column != x
+               and pd.api.types.is_numeric_dtype(df[column])]
+    if not columns:
+        return df.iloc[np.linspace(0, len(df) - 1, budget).astype(np.int64)]
+
+    x_values = _numeric(df.index if x is None else df[x])
+    x_values = x_values - x_values[0]
+    share = max(3, budget // len(columns))
+
+    keep = []
+    for column in columns:
+        y_values = df[column].to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(y_values))
+        if method == 'minmax':
+            picked = minmax_indices(y_values[valid], share)
+        else:
+            picked = lttb_indices(x_values[valid], y_values[valid], share)
+        keep.append(valid[picked])
+    return df.iloc[np.unique(np.concatenate(keep))]
@@ -0,0 +1,118 @@
+# Sai
+
+import numpy as np
+import pandas as pd
+
+# Columns score_batch() reads: the user profile plus the current metrics
+PROFILE_COLUMNS = ['age', 'gender', 'height', 'weight']
+METRIC_COLUMNS = [
+    'heart_rate', 'systolic_bp', 'diastolic_bp', 'blood_sugar',
+    'daily_steps', 'sleep_hours', 'hydration_glasses',
+]
+
+# Bit flags for generate_recommendations() entries, in the order it emits them
+RECOMMENDATION_CODES = {
+    'Exercise': 1,
+    'Sleep': 2,
+    'Hydration': 4,
+    'Blood Pressure': 8,
+    'Weight Management': 16,
+}
+
+
+def round_like_python(values, decimals=0):
+    """np.round, corrected to agree with Python's round() on every element.
+
+    np.round scales by 10**decimals before rounding, which can land a value on
+    the other side of .5 than Python's correctly rounded round(). Only the few
+    elements that sit that close to a tie are re-rounded in Python.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    near_tie = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(value, decimals) for value in values[near_tie].tolist()]
+    return rounded
+
+
+def batch_bmi(height_cm, weight):
+    """Vector form of HealthDashboard.calculate_bmi"""
+    height_m = np.asarray(height_cm, dtype=np.float64) / 100
+    return round_like_python(np.asarray(weight, dtype=np.float64) / height_m ** 2, 1)
+
+
+def batch_risk_scores(age, gender, bmi, systolic_bp, heart_rate, blood_sugar):
+    """Vector form of HealthDashboard.calculate_risk_scores.
+
+    Terms are added in the same order as the scalar version so the float sums,
+    and therefore the rounded scores, come out identical.
+    """
+    age = np.asarray(age, dtype=np.float64)
+    systolic_bp = np.asarray(systolic_bp)
+    male_over_45 = (np.asarray(gender) == 'Male') & (age > 45)
+
+    cardiovascular = (age * 0.8) + np.where(bmi > 25, 20, 0) \
+        + np.where(systolic_bp > 130, 15, 0) + np.where(np.asarray(heart_rate) > 80, 10, 0)
+    diabetes = (age * 0.6) + np.where(bmi > 30, 25, 0) \
+        + np.where(np.asarray(blood_sugar) > 100, 20, 0) + np.where(male_over_45, 15, 0)
+    hypertension = np.where(systolic_bp > 120, 30, 0) + (age * 0.7) + np.where(bmi > 28, 15, 0)
+
+    return {
+        'cardiovascular': np.rint(np.clip(cardiovascular, 0, 100)).astype(np.int64),
+        'diabetes': np.rint(np.clip(diabetes, 0, 100)).astype(np.int64),
+        'hypertension': np.rint(np.clip(hypertension, 0, 100)).astype(np.int64),
+    }
+
+
+def batch_health_score(bmi, heart_rate, systolic_bp, diastolic_bp, daily_steps, sleep_hours, hydration_glasses):
+    """Vector form of HealthDashboard.calculate_health_score"""
+    heart_rate = np.asarray(heart_rate)
+    sleep_hours = np.asarray(sleep_hours)
+    score = np.full(len(heart_rate), 100, dtype=np.int64)
+    score -= np.where((heart_rate < 60) | (heart_rate > 80), 10, 0)
+    score -= np.where((np.asarray(systolic_bp) > 130) | (np.asarray(diastolic_bp) > 85), 15, 0)
+    score -= np.where(bmi > 25, 10, 0)
+    score -= np.where(np.asarray(daily_steps) < 10000, 5, 0)
+    score -= np.where((sleep_hours < 7) | (sleep_hours > 9), 5, 0)
+    score -= np.where(np.asarray(hydration_glasses) < 8, 5, 0)
+    return np.maximum(0, score)
+
+
+def batch_recommendations(bmi, daily_steps, sleep_hours, hydration_glasses, systolic_bp):
+    """Vector form of HealthDashboard.generate_recommendations as RECOMMENDATION_CODES bit flags"""
+    codes = np.zeros(len(bmi), dtype=np.uint8)
+    codes |= np.where(np.asarray(daily_steps) < 10000, RECOMMENDATION_CODES['Exercise'], 0).astype(np.uint8)
+    codes |= np.where(np.asarray(sleep_hours) < 7, RECOMMENDATION_CODES['Sleep'], 0).astype(np.uint8)
+    codes |= np.where(np.asarray(hydration_glasses) < 8, RECOMMENDATION_CODES['Hydration'], 0).astype(np.uint8)
+    codes |= np.where(np.asarray(systolic_bp) > 130, RECOMMENDATION_CODES['Blood Pressure'], 0).astype(np.uint8)
+    codes |= np.where(bmi > 25, RECOMMENDATION_CODES['Weight Management'], 0).astype(np.uint8)
+    return codes
+
+
+def decode_recommendations(code):
+    """Recommendation categories encoded in one code, in generate_recommendations order"""
+    return [category for category, bit in RECOMMENDATION_CODES.items() if code & bit]
+
+
+def score_batch(data):
+    """Score many profiles at once.
+
+    `data` is a DataFrame (or dict of arrays) with PROFILE_COLUMNS and
+    METRIC_COLUMNS, height in cm. Returns a DataFrame with bmi, the three risk
+    scores, health_score and recommendation codes, row-aligned with the input.
+    """
+    columns = {column: np.asarray(data[column]) for column in PROFILE_COLUMNS + METRIC_COLUMNS}
+    bmi = batch_bmi(columns['height'], columns['weight'])
+    risks = batch_risk_scores(columns['age'], columns['gender'], bmi, columns['systolic_bp'],
+                              columns['heart_rate'], columns['blood_sugar'])
+    health_score = batch_health_score(bmi, columns['heart_rate'], columns['systolic_bp'], columns['diastolic_bp'],
+                                      columns['daily_steps'], columns['sleep_hours'], columns['hydration_glasses'])
+    recommendations = batch_recommendations(bmi, columns['daily_steps'], columns['sleep_hours'],
+                                            columns['hydration_glasses'], columns['systolic_bp'])
+    return pd.DataFrame({
+        'bmi': bmi,
+        **risks,
+        'health_score': health_score,
+        'recommendations': recommendations,
+    }, index=getattr(data, 'index', None))
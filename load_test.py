@@ -0,0 +1,152 @@
+# Sai
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import telemetry
+from patient_data import PatientIndex
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD = os.path.join(APP_DIR, "DiagnoGraph_SourceCode.py")
+PREDICTIVE = os.path.join(APP_DIR, "PredictiveModel.py")
+PREDICTIVE_PAGES = ["Overview", "Health Trends", "AI Predictions", "Recommendations"]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """One simulated browser session, recording the wall time of every script run"""
+
+    def __init__(self, script, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(script, default_timeout=timeout)
+        self.timings = []
+        self.errors = 0
+
+    def run(self, action=None):
+        started = time.perf_counter()
+        app = action(self.app) if action else self.app
+        app.run()
+        self.timings.append(time.perf_counter() - started)
+        self.errors += len(self.app.exception)
+
+
+def dashboard_session(patient_ids, actions, seed, timeout):
+    """Open the patient dashboard, then alternate between switching patients and pressing Summarise"""
+    rng = random.Random(seed)
+    session = Session(DASHBOARD, timeout)
+    session.run()
+    for step in range(actions):
+        if step % 2 == 0:
+            patient_id = rng.choice(patient_ids)
+            session.run(lambda app: app.sidebar.text_input[0].set_value(patient_id))
+        else:
+            session.run(lambda app: next(button for button in app.button if button.label == "Summarise").click())
+    return "dashboard", session
+
+
+def predictive_session(actions, seed, timeout):
+    """Open the predictive dashboard and move between its pages"""
+    rng = random.Random(seed)
+    session = Session(PREDICTIVE, timeout)
+    session.run()
+    for _ in range(actions):
+        page = rng.choice(PREDICTIVE_PAGES)
+        session.run(lambda app: app.sidebar.radio[0].set_value(page))
+    return "predictive", session
+
+
+def percentiles(timings):
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return {'runs': len(timings), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': max(timings) * 1000}
+
+
+def run_load_test(sessions=8, actions=10, concurrency=4, predictive_share=0.25, seed=42, timeout=60):
+    """Drive `sessions` simulated users through both dashboards, `concurrency` at a time.
+
+    All sessions share this process, as they would share one Streamlit server,
+    so st.cache_resource / st.cache_data entries are shared between them.
+    """
+    from risk_model import load_model
+
+    patient_ids = PatientIndex.load().patient_ids()
+    predictive_sessions = int(round(sessions * predictive_share))
+    telemetry.enable()
+    telemetry.reset()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        futures = [
+            pool.submit(predictive_session, actions, seed + number, timeout) if number < predictive_sessions
+            else pool.submit(dashboard_session, patient_ids, actions, seed + number, timeout)
+            for number in range(sessions)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    report = {'sessions': sessions, 'actions': actions, 'concurrency': concurrency,
+              'elapsed_s': elapsed, 'peak_rss_mb': peak_rss_mb(), 'scripts': {}}
+    for script in ("dashboard", "predictive"):
+        timings = [timing for name, session in results if name == script for timing in session.timings]
+        if timings:
+            report['scripts'][script] = percentiles(timings)
+            report['scripts'][script]['errors'] = sum(session.errors for name, session in results if name == script)
+
+    report['caches'] = {name: {'calls': calls, 'misses': misses, 'hit_rate': rate}
+                        for name, (calls, misses, rate) in telemetry.cache_hit_rates().items()}
+    info = load_model.cache_info()
+    if info.hits + info.misses:
+        report['caches']['load_model'] = {'calls': info.hits + info.misses, 'misses': info.misses,
+                                          'hit_rate': info.hits / (info.hits + info.misses)}
+    return report
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions x {report['actions']} actions, {report['concurrency']} at a time, "
+          f"in {report['elapsed_s']:.1f}s; peak RSS {report['peak_rss_mb']:.0f} MB", file=sys.stderr)
+    for script, stats in report['scripts'].items():
+        print(f"  {script:<12} {stats['runs']:5d} runs  p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms"
+              f"  p99 {stats['p99_ms']:8.1f} ms  errors {stats['errors']}", file=sys.stderr)
+    for name, stats in report['caches'].items():
+        print(f"  cache {name:<22} {stats['calls']:6d} calls  hit rate {stats['hit_rate']:.1%}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions against both dashboards")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--actions", type=int, default=10, help="interactions per session after the first load")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions running at the same time")
+    parser.add_argument("--predictive-share", type=float, default=0.25,
+                        help="share of sessions that use PredictiveModel.py")
+    parser.add_argument("--data", help="directory with the three CSV files, e.g. from synthetic_data.py")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    parser.add_argument("--out", default="-", help="JSON report file, or - for stdout")
+    args = parser.parse_args()
+
+    if args.data:
+        os.chdir(args.data)
+    report = run_load_test(args.sessions, args.actions, args.concurrency, args.predictive_share,
+                           args.seed, args.timeout)
+    print_report(report)
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+# Sai
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DETAILS_CSV = "all_patients_details.csv"
+HISTORY_CSV = "medical_history.csv"
+RECORDS_CSV = "health_records.csv"
+
+# Arrow IPC files written by `python patient_data.py convert`
+COLUMNAR_DIR = "columnar"
+TABLE_FILES = {
+    'details': "details.arrow",
+    'history': "history.arrow",
+    'records': "records.arrow",
+}
+# Each table's patient_offsets(), written alongside it so attached processes map
+# them instead of building a dict per process
+OFFSET_FILES = {name: f"{name}_offsets.arrow" for name in TABLE_FILES}
+# Schema metadata recording how many bytes of health_records.csv the store holds
+RECORDS_OFFSET_KEY = b"diagnograph.records_offset"
+# ...and records_file_state() of that file when the store was written
+RECORDS_FILE_KEY = b"diagnograph.records_file"
+# Bytes just before the offset that refresh() compares, to tell an append from a rewrite
+BOUNDARY_BYTES = 256
+
+# Shared read-only snapshots published by `python patient_data.py publish`
+SHARED_DIR = os.environ.get("DIAGNOGRAPH_SHARED_DIR")
+SNAPSHOT_POINTER = "CURRENT"
+
+# Narrow dtypes for the memory-optimised load mode. Integer vitals fall back
+# to float32 when a column has missing values.
+SHRINK_DTYPES = {
+    'age': 'int16',
+    'blood_pressure_systolic': 'int16',
+    'blood_pressure_diastolic': 'int16',
+    'heart_rate': 'int16',
+    'respiratory_rate': 'int16',
+    'blood_sugar_level': 'float32',
+    'weight': 'float32',
+    'height': 'float32',
+}
+# Free-text columns with at most this share of distinct values become categorical
+CATEGORY_RATIO = 0.5
+SHRINK_TABLES = os.environ.get("DIAGNOGRAPH_SHRINK", "0") == "1"
+
+# Appended rows are kept per patient until they reach this share of the sorted
+# records table, then everything is merged back into a single sorted table
+COMPACT_RATIO = 0.1
+
+
+def normalise_patient_ids(df):
+    """Store patient_id as stripped strings so lookups match the sidebar input"""
+    if 'patient_id' in df.columns:
+        df['patient_id'] = df['patient_id'].astype(str).str.strip()
+    return df
+
+
+class _BoundedReader(io.RawIOBase):
+    """Expose at most `limit` bytes of an open file from its current position"""
+
+    def __init__(self, file, limit):
+        self._file = file
+        self._remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _last_line_end(file, size, chunk_size=1 << 16):
+    """Offset just past the last newline in the first `size` bytes of the file"""
+    end = size
+    while end > 0:
+        start = max(0, end - chunk_size)
+        file.seek(start)
+        newline = file.read(end - start).rfind(b"\n")
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+def read_records_csv(path=RECORDS_CSV, offset=0, names=None):
+    """Parse complete lines of health_records.csv from `offset` onwards.
+
+    A line still being written is left for the next read. Returns the rows and
+    the offset to continue from; pass the header as `names` when offset > 0.
+    """
+    with open(path, "rb") as file:
+        end = _last_line_end(file, os.fstat(file.fileno()).st_size)
+        if end <= offset:
+            return None, offset
+        file.seek(offset)
+        reader = io.BufferedReader(_BoundedReader(file, end - offset))
+        if names is None:
+            records_df = pd.read_csv(reader)
+        else:
+            records_df = pd.read_csv(reader, header=None, names=names)
+    return normalise_patient_ids(records_df), end
+
+
+def records_file_state(path, offset):
+    """What identifies health_records.csv as the file read up to `offset`.
+
+    The device and inode, the modification time, the size, and the bytes just
+    before the offset; None when the file does not exist.
+    """
+    try:
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            file.seek(max(0, offset - BOUNDARY_BYTES))
+            boundary = file.read(min(offset, BOUNDARY_BYTES))
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino), stat.st_mtime_ns, stat.st_size, boundary
+
+
+def read_csv_tables(details_path=DETAILS_CSV, history_path=HISTORY_CSV, records_path=RECORDS_CSV):
+    """Read the three patient CSV files, plus the bytes of health_records.csv consumed"""
+    details_df = normalise_patient_ids(pd.read_csv(details_path))
+    history_df = normalise_patient_ids(pd.read_csv(history_path))
+    records_df, records_offset = read_records_csv(records_path)
+    return details_df, history_df, records_df, records_offset
+
+
+def sort_tables(details_df, history_df, records_df):
+    """Stably sort the tables by patient_id, and records also by date_recorded"""
+    return (
+        _sort(details_df, ['patient_id']),
+        _sort(history_df, ['patient_id']),
+        _sort(records_df, ['patient_id', 'date_recorded']),
+    )
+
+
+def _sort(df, keys):
+    keys = [key for key in keys if key in df.columns]
+    return df.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def write_columnar_store(details_df, history_df, records_df, records_offset=0, directory=COLUMNAR_DIR,
+                         records_file=None):
+    """Write typed, pre-sorted Arrow IPC copies of the three tables.
+
+    `records_offset` and `records_file` (records_file_state() of the CSV at
+    that offset) are kept in the records metadata, so an index loaded later
+    resumes from the rows appended since.
+    """
+    import pyarrow as pa
+
+    records_df = records_df.copy()
+    if 'date_recorded' in records_df.columns:
+        records_df['date_recorded'] = pd.to_datetime(records_df['date_recorded'], errors='coerce')
+
+    os.makedirs(directory, exist_ok=True)
+    tables = dict(zip(TABLE_FILES, sort_tables(details_df, history_df, records_df)))
+    for name, df in tables.items():
+        path = os.path.join(directory, TABLE_FILES[name])
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if name == 'records':
+            metadata = dict(table.schema.metadata or {})
+            metadata[RECORDS_OFFSET_KEY] = str(records_offset).encode()
+            if records_file is not None:
+                (device, inode), mtime_ns, size, boundary = records_file
+                metadata[RECORDS_FILE_KEY] = json.dumps({'device': device, 'inode': inode, 'mtime_ns': mtime_ns,
+                                                         'size': size, 'boundary': boundary.hex()}).encode()
+            table = table.replace_schema_metadata(metadata)
+        _write_arrow(table, path)
+
+        offsets = patient_offsets(df['patient_id'])
+        _write_arrow(pa.table({
+            'patient_id': pa.array(list(offsets), pa.string()),
+            'start': pa.array([start for start, _ in offsets.values()], pa.int64()),
+            'stop': pa.array([stop for _, stop in offsets.values()], pa.int64()),
+        }), os.path.join(directory, OFFSET_FILES[name]))
+
+
+def _write_arrow(table, path):
+    import pyarrow as pa
+
+    # Write next to the target and rename so readers never see a partial file
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+
+def has_columnar_store(directory=COLUMNAR_DIR):
+    return all(os.path.exists(os.path.join(directory, file)) for file in TABLE_FILES.values())
+
+
+def _arrow_strings(arrow_type):
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def read_columnar_store(directory=COLUMNAR_DIR, zero_copy=False):
+    """Memory-map the Arrow IPC tables; numeric columns stay backed by the mapped file.
+
+    With zero_copy, text columns are also left as Arrow arrays over the mapping
+    instead of being converted into Python strings.
+    """
+    import pyarrow as pa
+
+    frames = []
+    for file in TABLE_FILES.values():
+        source = pa.memory_map(os.path.join(directory, file), "r")
+        table = pa.ipc.open_file(source).read_all()
+        frames.append(table.to_pandas(split_blocks=True, types_mapper=_arrow_strings if zero_copy else None))
+    records_offset = int((table.schema.metadata or {}).get(RECORDS_OFFSET_KEY, 0))
+    return (*frames, records_offset)
+
+
+def read_records_file(directory=COLUMNAR_DIR):
+    """The records_file_state() a columnar store was written with, or None when it was not recorded"""
+    import pyarrow as pa
+
+    source = pa.memory_map(os.path.join(directory, TABLE_FILES['records']), "r")
+    recorded = (pa.ipc.open_file(source).schema.metadata or {}).get(RECORDS_FILE_KEY)
+    if recorded is None:
+        return None
+    state = json.loads(recorded)
+    return ((state['device'], state['inode']), state['mtime_ns'], state['size'],
+            bytes.fromhex(state['boundary']))
+
+
+def read_offsets(directory=COLUMNAR_DIR):
+    """The MappedOffsets of each table in a columnar store, or None for a store written without them"""
+    import pyarrow as pa
+
+    paths = [os.path.join(directory, OFFSET_FILES[name]) for name in TABLE_FILES]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return tuple(MappedOffsets(pa.ipc.open_file(pa.memory_map(path, "r")).read_all()) for path in paths)
+
+
+def publish_snapshot(root=SHARED_DIR, keep=2):
+    """Write the CSV files as a new read-only snapshot and make it current.
+
+    The CURRENT pointer is swapped with an atomic rename, so attached processes
+    see either the old or the new snapshot, never a mix. Older snapshots beyond
+    `keep` are removed; processes that still map them keep their pages.
+    """
+    import shutil
+
+    *tables, records_offset = read_csv_tables()
+    name = f"snapshot-{time.time_ns()}"
+    write_columnar_store(*tables, records_offset=records_offset, directory=os.path.join(root, name),
+                         records_file=records_file_state(RECORDS_CSV, records_offset))
+
+    pointer = os.path.join(root, SNAPSHOT_POINTER)
+    with open(pointer + ".tmp", "w") as file:
+        file.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    snapshots = sorted(entry for entry in os.listdir(root) if entry.startswith("snapshot-"))
+    for stale in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+    return os.path.join(root, name)
+
+
+def current_snapshot(root=SHARED_DIR):
+    """Directory of the published snapshot, or None when there is none"""
+    if not root:
+        return None
+    try:
+        with open(os.path.join(root, SNAPSHOT_POINTER)) as file:
+            return os.path.join(root, file.read().strip())
+    except OSError:
+        return None
+
+
+def _as_category(values):
+    return pd.Categorical(np.asarray(values, dtype=object))
+
+
+def shrink_table(df):
+    """Copy of a table with categorical ids and text, narrow numerics and parsed dates"""
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if column == 'patient_id':
+            df[column] = _as_category(values)
+        elif column == 'date_recorded':
+            df[column] = pd.to_datetime(values, errors='coerce')
+        elif column in SHRINK_DTYPES:
+            dtype = SHRINK_DTYPES[column]
+            if dtype.startswith('int') and values.isna().any():
+                dtype = 'float32'
+            df[column] = values.astype(dtype)
+        elif (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)) \
+                and values.nunique() <= CATEGORY_RATIO * len(values):
+            df[column] = values.astype('category')
+    return df
+
+
+def memory_footprint(df):
+    """Bytes held by a table, including the Python strings it references"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def patient_offsets(ids):
+    """Map each patient_id to its (start, stop) row range in an array sorted by patient_id"""
+    if len(ids) == 0:
+        return {}
+    # Compare through pandas so categorical codes and Arrow-backed strings are
+    # compared in place rather than materialized as Python objects
+    ids = pd.Series(ids).reset_index(drop=True)
+    starts = np.flatnonzero(ids.ne(ids.shift()).fillna(True).to_numpy(dtype=bool))
+    stops = np.r_[starts[1:], len(ids)]
+    keys = ids.iloc[starts].tolist()
+    return {pid: (int(start), int(stop)) for pid, start, stop in zip(keys, starts, stops)}
+
+
+class MappedOffsets:
+    """patient_offsets() read from a memory-mapped Arrow table.
+
+    Ids are kept in their sorted order and found by binary search, so a
+    process attached to a snapshot shares the pages instead of holding a
+    dict with a Python object per patient.
+    """
+
+    def __init__(self, table):
+        self._ids = table.column('patient_id').combine_chunks()
+        self._starts = table.column('start').combine_chunks().to_numpy()
+        self._stops = table.column('stop').combine_chunks().to_numpy()
+
+    def _position(self, patient_id):
+        low, high = 0, len(self._ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self._ids[middle].as_py() < patient_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._ids) and self._ids[low].as_py() == patient_id:
+            return low
+        return None
+
+    def get(self, patient_id, default=None):
+        position = self._position(patient_id) if isinstance(patient_id, str) else None
+        if position is None:
+            return default
+        return int(self._starts[position]), int(self._stops[position])
+
+    def __contains__(self, patient_id):
+        return self.get(patient_id) is not None
+
+    def __iter__(self):
+        return iter(self._ids.to_pylist())
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class PatientIndex:
+    """Patient-keyed access to the details, history and records tables.
+
+    Each table is stably sorted by patient_id (records also by date_recorded)
+    once, and a patient's rows are then a contiguous slice, so a lookup costs
+    O(rows for that patient) instead of a boolean scan over the whole table.
+
+    Rows appended to health_records.csv are picked up by refresh(), which
+    parses only the new bytes. `version` counts ingests and patient_version()
+    tells which ingest last touched a patient, so per-patient caches keyed on
+    it are invalidated only for patients that received new readings. Indexes
+    that fold in each new batch themselves can subscribe() instead.
+    """
+
+    def __init__(self, details_df, history_df, records_df, presorted=False,
+                 records_path=None, records_offset=0, shrink=False, offsets=None, records_file=None):
+        self.shrink = shrink
+        self.memory_report = None
+        self.snapshot = None
+        if shrink:
+            tables = (details_df, history_df, records_df)
+            before = [memory_footprint(df) for df in tables]
+            details_df, history_df, records_df = (shrink_table(df) for df in tables)
+            after = [memory_footprint(df) for df in (details_df, history_df, records_df)]
+            self.memory_report = pd.DataFrame(
+                {'rows': [len(df) for df in tables], 'before_bytes': before, 'after_bytes': after},
+                index=list(TABLE_FILES))
+            self.memory_report['saved_pct'] = (
+                100 * (1 - self.memory_report['after_bytes'] / self.memory_report['before_bytes'])).round(1)
+
+        if not presorted:
+            details_df, history_df, records_df = sort_tables(details_df, history_df, records_df)
+        self.details_df = details_df
+        self.history_df = history_df
+
+        # Precomputed offsets (details, history, records) come with an attached snapshot
+        if offsets is None:
+            offsets = (patient_offsets(details_df['patient_id']), patient_offsets(history_df['patient_id']), None)
+        self._details_offsets, self._history_offsets, records_offsets = offsets
+
+        self.records_path = records_path
+        self.records_offset = records_offset
+        # Identifies the file the first records_offset bytes were read from; taken
+        # now unless the caller recorded it when those bytes were read
+        if records_file is None and records_path:
+            records_file = records_file_state(records_path, records_offset)
+        self._records_file = records_file
+        self.version = 0
+        self._reset_version = 0
+        self._patient_versions = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._set_records(records_df, records_offsets)
+
+    @classmethod
+    def from_csv(cls, details_path=DETAILS_CSV, history_path=HISTORY_CSV, records_path=RECORDS_CSV,
+                 shrink=False):
+        details_df, history_df, records_df, records_offset = read_csv_tables(
+            details_path, history_path, records_path)
+        return cls(details_df, history_df, records_df,
+                   records_path=records_path, records_offset=records_offset, shrink=shrink)
+
+    @classmethod
+    def from_columnar(cls, directory=COLUMNAR_DIR, records_path=RECORDS_CSV, shrink=False):
+        details_df, history_df, records_df, records_offset = read_columnar_store(directory)
+        return cls(details_df, history_df, records_df, presorted=True, records_path=records_path,
+                   records_offset=records_offset, shrink=shrink, records_file=read_records_file(directory))
+
+    @classmethod
+    def attach(cls, snapshot):
+        """Read-only view of a published snapshot, shared zero-copy with other processes"""
+        details_df, history_df, records_df, _ = read_columnar_store(snapshot, zero_copy=True)
+        index = cls(details_df, history_df, records_df, presorted=True, offsets=read_offsets(snapshot))
+        index.snapshot = snapshot
+        return index
+
+    @classmethod
+    def load(cls, directory=COLUMNAR_DIR, shrink=SHRINK_TABLES):
+        """Use the columnar store when it has been built, otherwise parse the CSV files"""
+        if has_columnar_store(directory):
+            return cls.from_columnar(directory, shrink=shrink)
+        return cls.from_csv(shrink=shrink)
+
+    def _set_records(self, records_df, offsets=None):
+        # Swapped as one tuple so readers never pair a table with stale offsets
+        if offsets is None:
+            offsets = patient_offsets(records_df['patient_id'])
+        self._records_state = (records_df, offsets, {})
+        self._tail_rows = 0
+
+    def _match_dtypes(self, records_df):
+        # Parsed CSV rows arrive as strings and int64/float64; give them the
+        # table's date and narrow numeric dtypes. Ids stay strings until merged.
+        for column, dtype in self._records_state[0].dtypes.items():
+            if column not in records_df.columns or column == 'patient_id':
+                continue
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                records_df[column] = pd.to_datetime(records_df[column], errors='coerce')
+            elif self.shrink and pd.api.types.is_numeric_dtype(dtype):
+                if pd.api.types.is_float_dtype(dtype) or not records_df[column].isna().any():
+                    records_df[column] = records_df[column].astype(dtype)
+        return records_df
+
+    @staticmethod
+    def _slice(df, offsets, patient_id):
+        start, stop = offsets.get(patient_id, (0, 0))
+        return df.iloc[start:stop]
+
+    @property
+    def records_df(self):
+        """The full records table, sorted, including any appended rows"""
+        if self._tail_rows:
+            self.compact()
+        return self._records_state[0]
+
+    def details(self, patient_id):
+        """Rows of all_patients_details.csv for one patient"""
+        return self._slice(self.details_df, self._details_offsets, patient_id)
+
+    def history(self, patient_id):
+        """Rows of medical_history.csv for one patient"""
+        return self._slice(self.history_df, self._history_offsets, patient_id)
+
+    def records(self, patient_id, start=None, end=None):
+        """Rows of health_records.csv for one patient, oldest first, optionally within [start, end]"""
+        records_df, offsets, tails = self._records_state
+        rows = self._slice(records_df, offsets, patient_id)
+        tail = tails.get(patient_id)
+        if tail is not None:
+            rows = pd.concat([rows, tail]).sort_values('date_recorded', kind='stable')
+        if start is None and end is None:
+            return rows
+        dates = rows['date_recorded']
+        # Parsed dates compare with timestamps, dates read as text with strings
+        bound = pd.Timestamp if pd.api.types.is_datetime64_any_dtype(dates) else str
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= (dates >= bound(start)).to_numpy()
+        if end is not None:
+            keep &= (dates <= bound(end)).to_numpy()
+        return rows[keep]
+
+    def latest_reading(self, patient_id):
+        """date_recorded of the patient's newest reading, or None when they have none"""
+        dates = self.records(patient_id)['date_recorded'].dropna()
+        return dates.max() if len(dates) else None
+
+    def cohort_tables(self):
+        """Details, history and records for a cohort-wide assessment"""
+        return self.details_df, self.history_df, self.records_df
+
+    @staticmethod
+    def _take(df, offsets, patient_ids):
+        ranges = np.array([offsets.get(patient_id, (0, 0)) for patient_id in patient_ids],
+                          dtype=np.int64).reshape(-1, 2)
+        lengths = ranges[:, 1] - ranges[:, 0]
+        # Each patient's rows are start, start + 1, ...: one gather instead of a concat of slices
+        positions = np.repeat(ranges[:, 0] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return df.iloc[positions]
+
+    def tables_for(self, patient_ids):
+        """Details, history and records restricted to the given patients, in the order given"""
+        with self._lock:
+            records_df = self.records_df
+            records_offsets = self._records_state[1]
+        return (self._take(self.details_df, self._details_offsets, patient_ids),
+                self._take(self.history_df, self._history_offsets, patient_ids),
+                self._take(records_df, records_offsets, patient_ids))
+
+    def patient_ids(self):
+        """Every patient_id that has personal details"""
+        return list(self._details_offsets)
+
+    def patient_version(self, patient_id):
+        """Data version at which this patient's records last changed"""
+        return max(self._reset_version, self._patient_versions.get(patient_id, 0))
+
+    def __contains__(self, patient_id):
+        return patient_id in self._details_offsets
+
+    def subscribe(self, listener):
+        """Call listener(new_records) after each ingest; new_records is None after a full reload"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, new_records):
+        for listener in self._listeners:
+            listener(new_records)
+
+    def append_records(self, new_records):
+        """Merge new health records in and return the ids of the patients they touch"""
+        if new_records is None or new_records.empty:
+            return set()
+        with self._lock:
+            records_df, offsets, tails = self._records_state
+            new_records = self._match_dtypes(normalise_patient_ids(new_records))
+
+            tails = dict(tails)
+            for patient_id, rows in new_records.groupby('patient_id', sort=False):
+                tail = tails.get(patient_id)
+                tails[patient_id] = rows if tail is None else pd.concat([tail, rows])
+            self._records_state = (records_df, offsets, tails)
+            self._tail_rows += len(new_records)
+
+            self.version += 1
+            changed = set(new_records['patient_id'].unique())
+            for patient_id in changed:
+                self._patient_versions[patient_id] = self.version
+
+            if self._tail_rows > COMPACT_RATIO * len(records_df):
+                self.compact()
+            self._notify(new_records)
+            return changed
+
+    def compact(self):
+        """Fold appended rows back into the sorted records table"""
+        with self._lock:
+            records_df, _, tails = self._records_state
+            if tails:
+                merged = pd.concat([records_df, *tails.values()])
+                if self.shrink:
+                    merged['patient_id'] = _as_category(merged['patient_id'])
+                self._set_records(_sort(merged, ['patient_id', 'date_recorded']))
+
+    def refresh(self):
+        """Ingest rows appended to health_records.csv since the last read.
+
+        Returns the ids of the patients that received new readings. If the
+        file was replaced or rewritten rather than appended to (a new inode,
+        a shrink, a new mtime at the same size, or different bytes before the
+        offset), the records are reloaded from scratch.
+        """
+        if self.records_path is None:
+            return set()
+        state = records_file_state(self.records_path, self.records_offset)
+        if state is None or state == self._records_file:
+            return set()
+
+        with self._lock:
+            if self._records_replaced(state):
+                return self._reload_records()
+            columns = list(self._records_state[0].columns)
+            new_records, self.records_offset = read_records_csv(
+                self.records_path, self.records_offset, names=columns)
+            self._records_file = records_file_state(self.records_path, self.records_offset)
+            return self.append_records(new_records)
+
+    def _records_replaced(self, state):
+        identity, mtime, size, boundary = state
+        if self._records_file is None:
+            # The file appeared after loading; the offset is all there is to go on
+            return size < self.records_offset
+        known_identity, known_mtime, _, known_boundary = self._records_file
+        if identity != known_identity or size < self.records_offset or boundary != known_boundary:
+            return True
+        # Appending grows the file, so a new mtime at the same size means it was rewritten
+        return size == self.records_offset and mtime != known_mtime
+
+    def _reload_records(self):
+        records_df, self.records_offset = read_records_csv(self.records_path)
+        self._records_file = records_file_state(self.records_path, self.records_offset)
+        if records_df is None:
+            records_df = self._records_state[0].iloc[:0]
+        records_df = self._match_dtypes(records_df)
+        if self.shrink:
+            records_df = shrink_table(records_df)
+        self._set_records(_sort(records_df, ['patient_id', 'date_recorded']))
+        self.version += 1
+        self._reset_version = self.version
+        self._patient_versions = {}
+        self._notify(None)
+        return set(records_df['patient_id'].unique())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DiagnoGraph patient data tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert the CSV files into the columnar store")
+    convert.add_argument("--details", default=DETAILS_CSV)
+    convert.add_argument("--history", default=HISTORY_CSV)
+    convert.add_argument("--records", default=RECORDS_CSV)
+    convert.add_argument("--out", default=COLUMNAR_DIR, help="output directory")
+
+    footprint = commands.add_parser("footprint", help="report table memory before and after shrinking")
+    footprint.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+
+    publish = commands.add_parser("publish", help="publish a shared read-only snapshot of the CSV files")
+    publish.add_argument("--root", default=SHARED_DIR or "shared", help="snapshot directory")
+    publish.add_argument("--keep", type=int, default=2, help="snapshots to keep")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        *tables, records_offset = read_csv_tables(args.details, args.history, args.records)
+        write_columnar_store(*tables, records_offset=records_offset, directory=args.out,
+                             records_file=records_file_state(args.records, records_offset))
+        print(f"Wrote {sum(len(df) for df in tables)} rows to {args.out}/")
+    elif args.command == "publish":
+        print(f"Published {publish_snapshot(args.root, args.keep)}")
+    elif args.command == "footprint":
+        report = PatientIndex.load(args.store, shrink=True).memory_report
+        print(report.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Sai
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from downsample import downsample
+from patient_data import memory_footprint
+from risk_assessment import assess_cohort
+from telemetry import increment
+
+# Memory budget for prepared views across every session in the process
+VIEW_CACHE_BYTES = int(os.environ.get("DIAGNOGRAPH_VIEW_CACHE_MB", 64)) << 20
+
+CHART_LABELS = {
+    'blood_pressure_systolic': 'Systolic (mmHg)',
+    'blood_pressure_diastolic': 'Diastolic (mmHg)',
+    'heart_rate': 'Heart Rate (bpm)',
+    'respiratory_rate': 'Respiratory Rate',
+    'blood_sugar_level': 'Blood Glucose (mg/dL)',
+}
+
+
+def view_bytes(value):
+    """Approximate memory held by a view part: tables by their footprint, containers by their contents"""
+    if isinstance(value, pd.DataFrame):
+        return memory_footprint(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(view_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(view_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def build_charts(rollup):
+    """Downsampled, labelled chart series for one patient's rollup, or None when there is no data"""
+    if rollup.empty:
+        return None
+    frame = rollup.set_index('date_recorded')
+    return {
+        'blood_pressure': downsample(frame[['blood_pressure_systolic', 'blood_pressure_diastolic']])
+        .rename(columns=CHART_LABELS),
+        'heart_rate': downsample(frame[['heart_rate']]).rename(columns=CHART_LABELS),
+        'respiratory_rate': downsample(frame[['respiratory_rate']], method='minmax').rename(columns=CHART_LABELS),
+        'blood_glucose': downsample(frame[['blood_sugar_level']]).rename(columns=CHART_LABELS),
+    }
+
+
+def build_latest(rollup):
+    """Latest weight, height and BMI from a patient's daily rollup, or None when there is no data"""
+    if rollup.empty:
+        return None
+    weight = round(rollup['weight_last'].iloc[-1], 2)
+    height = round(rollup['height_last'].iloc[-1], 2)
+    return {'weight': weight, 'height': height, 'bmi': round(weight / (height ** 2), 2)}
+
+
+def build_history_tables(history):
+    """The Medical History and Current Medications tables, one column of details each"""
+    label = {history.columns[1]: 'Details'}
+    return (history.drop(columns=['patient_id']).T.rename(columns=label),
+            history.drop(columns=['previous_medical_condition']).drop(columns=['patient_id']).T.rename(columns=label))
+
+
+class _View:
+    __slots__ = ('version', 'parts', 'bytes')
+
+    def __init__(self, version):
+        self.version = version
+        self.parts = {}
+        self.bytes = 0
+
+
+class PatientViewCache:
+    """Prepared per-patient view models, shared by every session in the process.
+
+    A view holds the parts the dashboard renders for one patient (chart
+    series per grain and period, the latest weight/height/BMI, the history
+    tables, the risk summary), each built on first use. Views are keyed by the patient's
+    data version, so ingesting new readings for a patient makes the next read
+    rebuild their view. Least recently used views are evicted once the parts
+    held exceed `budget` bytes. Parts are shared between sessions and must not
+    be modified by callers.
+    """
+
+    def __init__(self, patient_index, rollup_store, budget=VIEW_CACHE_BYTES):
+        self.patient_index = patient_index
+        self.rollup_store = rollup_store
+        self.budget = budget
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def _part(self, patient_id, part, build):
+        version = self.patient_index.patient_version(patient_id)
+        increment("patient_views.calls")
+        with self._lock:
+            view = self._views.get(patient_id)
+            if view is not None and view.version == version and part in view.parts:
+                self._views.move_to_end(patient_id)
+                self.hits += 1
+                return view.parts[part]
+
+        value = build()
+        size = view_bytes(value)
+        increment("patient_views.misses")
+        with self._lock:
+            self.misses += 1
+            view = self._views.get(patient_id)
+            if view is None or view.version != version:
+                if view is not None:
+                    self.resident_bytes -= view.bytes
+                view = self._views[patient_id] = _View(version)
+            if part not in view.parts:
+                view.parts[part] = value
+                view.bytes += size
+                self.resident_bytes += size
+            self._views.move_to_end(patient_id)
+            while self.resident_bytes > self.budget and len(self._views) > 1:
+                _, evicted = self._views.popitem(last=False)
+                self.resident_bytes -= evicted.bytes
+                self.evictions += 1
+        return value
+
+    def charts(self, patient_id, grain='D', days=None):
+        return self._part(patient_id, ('charts', grain, days),
+                          lambda: build_charts(self.rollup_store.rollup(patient_id, grain, days)))
+
+    def latest(self, patient_id):
+        return self._part(patient_id, 'latest', lambda: build_latest(self.rollup_store.rollup(patient_id, 'D')))
+
+    def history_tables(self, patient_id):
+        return self._part(patient_id, 'history', lambda: build_history_tables(self.patient_index.history(patient_id)))
+
+    def summary(self, patient_id):
+        """The patient's assess_cohort row, or None when any of their tables is empty"""
+        def build():
+            info = self.patient_index.details(patient_id)
+            history = self.patient_index.history(patient_id)
+            records = self.patient_index.records(patient_id)
+            if info.empty or history.empty or records.empty:
+                return None
+            return assess_cohort(info, history, records).iloc[0]
+        return self._part(patient_id, 'summary', build)
+
+    def stats(self):
+        return {'views': len(self._views), 'resident_bytes': self.resident_bytes, 'budget': self.budget,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
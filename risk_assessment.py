@@ -0,0 +1,82 @@
+# Sai
+
+import argparse
+
+import numpy as np
+
+# Readings outside these ranges are flagged in the patient summary
+NORMAL_RANGES = {
+    'blood_pressure_systolic': (90, 140),
+    'blood_pressure_diastolic': (60, 90),
+    'heart_rate': (60, 100),
+    'blood_sugar_level': (70, 140),
+    'BMI': (18.5, 24.9),
+}
+
+# Each reading above its limit adds one point to the risk score
+RISK_LIMITS = {
+    'blood_pressure_systolic': 140,
+    'blood_sugar_level': 180,
+    'BMI': 30,
+}
+
+RISK_LEVELS = np.array(["Low", "Moderate", "High"])
+
+
+def latest_readings(records_df):
+    """Last reading per patient, with BMI derived from weight and height.
+
+    Records must be in date order within each patient, as PatientIndex keeps them.
+    """
+    latest = records_df.drop_duplicates('patient_id', keep='last')
+    return latest.assign(BMI=(latest['weight'] / latest['height'] ** 2).round(2))
+
+
+def assess_cohort(details_df, history_df, records_df):
+    """Flag the latest vitals and score the risk of every patient in one pass.
+
+    Returns one row per patient with personal details, conditions and
+    medications, the latest reading, a <vital>_flag column for each vital
+    outside its normal range, the risk score (0-3) and the risk level.
+    """
+    history = history_df.drop_duplicates('patient_id', keep='first')
+    table = (details_df.drop_duplicates('patient_id', keep='first')
+             .merge(history, on='patient_id')
+             .merge(latest_readings(records_df), on='patient_id'))
+    return score_readings(table)
+
+
+def score_readings(table):
+    """Add the <vital>_flag columns, risk_score and risk_level to rows of vitals and BMI"""
+    for vital, (low, high) in NORMAL_RANGES.items():
+        values = table[vital].to_numpy()
+        table[f"{vital}_flag"] = (values < low) | (values > high)
+
+    risk_score = np.zeros(len(table), dtype=np.int8)
+    for vital, limit in RISK_LIMITS.items():
+        risk_score += table[vital].to_numpy() > limit
+    table['risk_score'] = risk_score
+    table['risk_level'] = RISK_LEVELS[np.minimum(risk_score, len(RISK_LEVELS) - 1)]
+    return table
+
+
+def main():
+    from patient_data import COLUMNAR_DIR, PatientIndex
+
+    parser = argparse.ArgumentParser(description="Score every patient and export the risk table")
+    parser.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+    parser.add_argument("--level", action="append", choices=list(RISK_LEVELS),
+                        help="only keep these risk levels (repeatable)")
+    parser.add_argument("--out", default="risk_assessment.csv")
+    args = parser.parse_args()
+
+    index = PatientIndex.load(args.store)
+    table = assess_cohort(index.details_df, index.history_df, index.records_df)
+    if args.level:
+        table = table[table['risk_level'].isin(args.level)]
+    table.sort_values(['risk_score', 'patient_id'], ascending=[False, True]).to_csv(args.out, index=False)
+    print(f"Wrote {len(table)} patients to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
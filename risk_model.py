@@ -0,0 +1,169 @@
+# Sai
+
+import argparse
+import functools
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from patient_data import COLUMNAR_DIR, PatientIndex
+from risk_assessment import latest_readings
+
+MODEL_DIR = os.environ.get("DIAGNOGRAPH_MODEL_DIR", "models")
+MODEL_POINTER = "LATEST"
+
+FEATURES = [
+    'age', 'male', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+    'heart_rate', 'blood_sugar_level', 'BMI',
+]
+
+
+def build_features(frame):
+    """Model inputs from rows carrying age, gender, the vitals and weight/height"""
+    features = pd.DataFrame({
+        'age': frame['age'],
+        'male': (frame['gender'] == 'Male').astype(np.int8),
+        'blood_pressure_systolic': frame['blood_pressure_systolic'],
+        'blood_pressure_diastolic': frame['blood_pressure_diastolic'],
+        'heart_rate': frame['heart_rate'],
+        'blood_sugar_level': frame['blood_sugar_level'],
+        'BMI': frame['BMI'] if 'BMI' in frame else frame['weight'] / frame['height'] ** 2,
+    }, index=frame.index)
+    return features.to_numpy(dtype=np.float64)
+
+
+def condition_labels(history_df):
+    """One indicator column per condition named in previous_medical_condition"""
+    conditions = history_df['previous_medical_condition'].fillna("Normal").astype(str)
+    labels = conditions.str.get_dummies(sep=",")
+    labels.columns = labels.columns.str.strip()
+    labels = labels.T.groupby(level=0).max().T
+    labels = labels.drop(columns=["Normal"], errors="ignore")
+    labels.insert(0, 'patient_id', history_df['patient_id'].to_numpy())
+    return labels
+
+
+class RiskModel:
+    """A trained condition classifier together with the metadata it was trained with"""
+
+    def __init__(self, estimator, conditions, version, metadata=None):
+        self.estimator = estimator
+        self.conditions = conditions
+        self.version = version
+        self.metadata = metadata or {}
+
+    def predict_proba(self, frame):
+        """Probability of each condition for every row, in one batched call"""
+        if len(frame) == 0:
+            return pd.DataFrame(columns=self.conditions, index=frame.index, dtype=np.float64)
+        probabilities = self.estimator.predict_proba(build_features(frame))
+        if len(self.conditions) == 1:
+            probabilities = [probabilities]
+        # Multi-output forests return one (rows x classes) array per condition
+        columns = {
+            condition: proba[:, list(classes).index(1)] if 1 in classes else np.zeros(len(frame))
+            for condition, proba, classes in zip(self.conditions, probabilities, self._classes())
+        }
+        return pd.DataFrame(columns, index=frame.index)
+
+    def _classes(self):
+        classes = self.estimator.classes_
+        return classes if len(self.conditions) > 1 else [classes]
+
+    def score_patients(self, details_df, records_df):
+        """Condition probabilities from each patient's latest reading"""
+        latest = details_df[['patient_id', 'age', 'gender']].merge(latest_readings(records_df), on='patient_id')
+        scores = self.predict_proba(latest)
+        scores.insert(0, 'patient_id', latest['patient_id'].to_numpy())
+        return scores
+
+
+def train(index, n_estimators=200, random_state=42):
+    """Fit a random forest on every reading, labelled with the patient's conditions"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    labels = condition_labels(index.history_df.drop_duplicates('patient_id'))
+    conditions = [column for column in labels.columns if column != 'patient_id']
+    rows = (index.records_df
+            .merge(index.details_df[['patient_id', 'age', 'gender']], on='patient_id')
+            .merge(labels, on='patient_id'))
+
+    estimator = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=-1)
+    estimator.fit(build_features(rows), rows[conditions].to_numpy())
+
+    digest = hashlib.sha256(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+    metadata = {
+        'features': FEATURES,
+        'conditions': conditions,
+        'training_rows': len(rows),
+        'patients': int(rows['patient_id'].nunique()),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return RiskModel(estimator, conditions, version, metadata)
+
+
+def save_model(model, directory=MODEL_DIR):
+    """Write a versioned artifact and point LATEST at it"""
+    # A plain dict, so the artifact does not depend on the module being __main__
+    artifact = {'estimator': model.estimator, 'conditions': model.conditions,
+                'version': model.version, 'metadata': model.metadata}
+    return write_artifact(artifact, directory, f"risk_model-{model.version}.joblib", MODEL_POINTER)
+
+
+def write_artifact(artifact, directory, filename, pointer):
+    """Dump `artifact` to directory/filename, then atomically repoint `pointer` at it"""
+    import joblib
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    joblib.dump(artifact, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+    pointer = os.path.join(directory, pointer)
+    with open(pointer + ".tmp", "w") as file:
+        file.write(filename)
+    os.replace(pointer + ".tmp", pointer)
+    return path
+
+
+def latest_model_path(directory=MODEL_DIR, pointer=MODEL_POINTER):
+    try:
+        with open(os.path.join(directory, pointer)) as file:
+            return os.path.join(directory, file.read().strip())
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=2)
+def load_model(path):
+    """Load an artifact once per process; later calls and sessions reuse it"""
+    import joblib
+
+    return RiskModel(**joblib.load(path))
+
+
+def load_latest_model(directory=MODEL_DIR):
+    """The artifact LATEST points at, or None before any model has been trained"""
+    path = latest_model_path(directory)
+    return load_model(path) if path else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the DiagnoGraph condition risk model")
+    parser.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+    parser.add_argument("--out", default=MODEL_DIR, help="model directory")
+    parser.add_argument("--trees", type=int, default=200)
+    args = parser.parse_args()
+
+    model = train(PatientIndex.load(args.store), n_estimators=args.trees)
+    path = save_model(model, args.out)
+    print(f"Trained on {model.metadata['training_rows']} readings for {', '.join(model.conditions)}")
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# Sai
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection import load_latest_detector
+from patient_data import COLUMNAR_DIR, PatientIndex
+from risk_assessment import score_readings
+from risk_model import load_latest_model
+from telemetry import Histogram
+
+REQUIRED_FIELDS = ['blood_pressure_systolic', 'blood_pressure_diastolic', 'heart_rate', 'blood_sugar_level']
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def invalid_reading(row):
+    """Why a score request row cannot be scored, or None when it can"""
+    missing = [field for field in REQUIRED_FIELDS if field not in row]
+    if row.get('BMI') is None and not {'weight', 'height'} <= set(row):
+        missing += [field for field in ('weight', 'height') if field not in row]
+    if missing:
+        return f"missing fields: {missing}"
+    # age and BMI may be null: the row then skips the model or derives BMI from weight and height
+    numeric = REQUIRED_FIELDS + [field for field in ('BMI', 'weight', 'height', 'age') if row.get(field) is not None]
+    not_numeric = [field for field in numeric if not is_number(row[field])]
+    if not_numeric:
+        return f"fields must be numbers: {not_numeric}"
+    if row.get('BMI') is None and row['height'] == 0:
+        return "height must not be 0 when BMI is not given"
+    return None
+
+
+def score_rows(rows):
+    """Score a micro-batch: risk rules for every row, model probabilities for rows with age and gender
+    when a model is trained, and an anomaly score when a detector is fitted"""
+    frame = pd.DataFrame(rows)
+    given = set(frame.columns)
+    if {'weight', 'height'} <= set(frame.columns):
+        derived = (frame['weight'] / frame['height'] ** 2).round(2)
+        frame['BMI'] = frame['BMI'].fillna(derived) if 'BMI' in frame.columns else derived
+    scored = score_readings(frame)
+
+    model = load_latest_model()
+    if model is not None and {'age', 'gender'} <= set(frame.columns):
+        known = frame['age'].notna() & frame['gender'].notna()
+        if known.any():
+            probabilities = model.predict_proba(frame[known]).add_prefix('p_')
+            scored = scored.join(probabilities)
+            scored.loc[known, 'model_version'] = model.version
+
+    detector = load_latest_detector()
+    if detector is not None:
+        scored = detector.score(scored)
+        scored['anomaly_version'] = detector.version
+
+    # Echo each row's own fields untouched and add only what was computed: values
+    # that went through the shared frame take dtypes from the rest of the batch
+    computed = [column for column in scored.columns if column not in given or column == 'BMI']
+    results = []
+    for row, values in zip(rows, scored[computed].replace({np.nan: None}).to_dict('records')):
+        result = dict(row)
+        for field, value in values.items():
+            if value is not None and result.get(field) is None:
+                result[field] = value
+        results.append(result)
+    return results
+
+
+class MicroBatcher:
+    """Coalesce concurrent score requests into one vectorized call.
+
+    A batch closes when it reaches max_batch rows or when its first request
+    has waited max_latency seconds, whichever comes first. Scoring runs on a
+    worker thread so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, scorer, max_batch=256, max_latency=0.005):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.rows_scored = 0
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await loop.run_in_executor(self.executor, self.scorer, [row for row, _, _ in batch])
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            finished = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            self.rows_scored += len(batch)
+            for (_, future, started), result in zip(batch, results):
+                self.latency.observe(finished - started)
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self):
+        lines = [
+            "# HELP diagnograph_score_queue_depth Requests waiting for a batch",
+            "# TYPE diagnograph_score_queue_depth gauge",
+            f"diagnograph_score_queue_depth {self.queue.qsize()}",
+            "# HELP diagnograph_rows_scored_total Rows scored since start",
+            "# TYPE diagnograph_rows_scored_total counter",
+            f"diagnograph_rows_scored_total {self.rows_scored}",
+        ]
+        lines += self.batch_sizes.render("diagnograph_score_batch_size", "Rows per scoring batch")
+        lines += self.latency.render("diagnograph_score_latency_seconds", "Queue plus scoring time per row")
+        return "\n".join(lines) + "\n"
+
+
+class RiskServer:
+    """Minimal HTTP/1.1 front end: POST /score, GET /metrics, GET /health"""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            model = load_latest_model()
+            detector = load_latest_detector()
+            return 200, "application/json", {"status": "ok", "model": model.version if model else None,
+                                             "anomaly_model": detector.version if detector else None}
+        if method == "GET" and path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.batcher.metrics()
+        if method == "POST" and path == "/score":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return 400, "application/json", {"error": "body is not valid JSON"}
+            rows = payload.get('patients', [payload]) if isinstance(payload, dict) else None
+            if not rows or not all(isinstance(row, dict) for row in rows):
+                return 400, "application/json", {"error": "expected a reading object or {\"patients\": [...]}"}
+            # Rejected before queueing: one bad row would otherwise fail every request in its batch
+            for position, row in enumerate(rows):
+                error = invalid_reading(row)
+                if error:
+                    return 400, "application/json", {"error": error, "row": position}
+            results = await asyncio.gather(*(self.batcher.submit(row) for row in rows))
+            return 200, "application/json", results[0] if 'patients' not in payload else {"results": results}
+        return 404, "application/json", {"error": f"no route for {method} {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+                try:
+                    status, content_type, payload = await self.route(method, path, body)
+                except Exception as error:
+                    status, content_type, payload = 500, "application/json", {"error": str(error)}
+                if not isinstance(payload, str):
+                    payload = json.dumps(payload, default=str)
+                data = payload.encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, max_batch, max_latency):
+    batcher = MicroBatcher(score_rows, max_batch=max_batch, max_latency=max_latency)
+    server = RiskServer(batcher)
+    batch_task = asyncio.create_task(batcher.run())
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Scoring on http://{host}:{port} (max batch {max_batch}, max wait {max_latency * 1000:g} ms)")
+    async with listener:
+        try:
+            await listener.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+async def _request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+                 f"Content-Type: application/json\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return status, await reader.readexactly(length)
+
+
+def sample_payloads(store, count, seed=42):
+    """Score requests built from real readings joined with patient age and gender"""
+    index = PatientIndex.load(store)
+    rows = index.records_df.merge(index.details_df[['patient_id', 'age', 'gender']], on='patient_id')
+    rows = rows.drop(columns=['patient_id', 'date_recorded'])
+    records = rows.to_dict('records')
+    generator = random.Random(seed)
+    return [json.dumps(generator.choice(records), default=float).encode() for _ in range(count)]
+
+
+async def load_generate(host, port, concurrency, requests, store):
+    """Drive the server from `concurrency` keep-alive clients and report latency"""
+    payloads = sample_payloads(store, requests)
+    latencies = []
+    errors = 0
+
+    async def client(offset):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        for body in payloads[offset::concurrency]:
+            started = time.perf_counter()
+            status, _ = await _request(reader, writer, "POST", "/score", body)
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f"{len(latencies)} requests from {concurrency} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} req/s), {errors} errors")
+    print(f"latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+    for line in metrics.decode().splitlines():
+        if line.startswith(("diagnograph_score_batch_size_count", "diagnograph_score_batch_size_sum",
+                            "diagnograph_score_queue_depth")):
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local micro-batching risk scoring service")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the scoring service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--max-batch", type=int, default=256)
+    serve_parser.add_argument("--max-latency-ms", type=float, default=5.0,
+                              help="longest a request waits for its batch to fill")
+
+    loadgen = commands.add_parser("loadgen", help="send concurrent requests to a running service")
+    loadgen.add_argument("--host", default="127.0.0.1")
+    loadgen.add_argument("--port", type=int, default=8765)
+    loadgen.add_argument("--concurrency", type=int, default=64)
+    loadgen.add_argument("--requests", type=int, default=5000)
+    loadgen.add_argument("--store", default=COLUMNAR_DIR, help="columnar store, used when present")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_latency_ms / 1000))
+    else:
+        asyncio.run(load_generate(args.host, args.port, args.concurrency, args.requests, args.store))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Sai
+
+import threading
+
+import pandas as pd
+
+from patient_data import patient_offsets
+
+VITALS = [
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'heart_rate',
+    'blood_sugar_level',
+    'weight',
+    'height',
+    'respiratory_rate',
+]
+
+GRAINS = {
+    'D': "Daily",
+    'W': "Weekly",
+    'M': "Monthly",
+}
+
+# Chart windows in days, counted back from the patient's latest reading
+PERIODS = {
+    None: "All readings",
+    90: "Last 90 days",
+    365: "Last year",
+}
+
+
+def period_start(dates, grain):
+    """Start of the day, week (Monday) or month each timestamp falls in"""
+    if grain == 'D':
+        return dates.dt.floor('D')
+    return dates.dt.to_period(grain).dt.start_time
+
+
+def window_start(latest, days, grain):
+    """Start of the first period a window of `days` days ending on `latest` touches"""
+    cutoff = pd.Timestamp(latest).floor('D') - pd.Timedelta(days=days - 1)
+    return period_start(pd.Series([cutoff]), grain).iloc[0]
+
+
+def build_rollup(records_df, grain='D'):
+    """Aggregate vitals per patient and period.
+
+    Each vital keeps its own name for the period mean and gains _min, _max and
+    _last columns. Rows must already be in date order for _last to be the
+    latest reading, which PatientIndex guarantees.
+    """
+    vitals = [vital for vital in VITALS if vital in records_df.columns]
+    dates = pd.to_datetime(records_df['date_recorded'], errors='coerce')
+    frame = records_df[['patient_id', *vitals]].assign(date_recorded=period_start(dates, grain))
+
+    grouped = frame.groupby(['patient_id', 'date_recorded'], sort=True, observed=True)[vitals]
+    # One call per aggregate rather than agg([...]), which runs every vital and
+    # aggregate separately and dominates the cost for a single patient's rows
+    parts = {'mean': grouped.mean(), 'min': grouped.min(), 'max': grouped.max(), 'last': grouped.last()}
+    rollup = pd.concat({agg: part for agg, part in parts.items()}, axis=1)
+    rollup = rollup[[(agg, vital) for vital in vitals for agg in parts]]
+    rollup.columns = [vital if agg == 'mean' else f"{vital}_{agg}" for agg, vital in rollup.columns]
+    return rollup.reset_index()
+
+
+class RollupStore:
+    """Materialized per-patient rollups at daily, weekly and monthly grain.
+
+    The full tables are built once from the patient index. When a patient's
+    data version moves on (new readings were ingested), only that patient's
+    rollups are rebuilt, from their own records, the next time they are read.
+    """
+
+    def __init__(self, patient_index, grains=tuple(GRAINS)):
+        self.patient_index = patient_index
+        self._lock = threading.Lock()
+        self._built_version = patient_index.version
+        records_df = patient_index.records_df
+
+        self._tables = {}
+        for grain in grains:
+            rollup = build_rollup(records_df, grain)
+            self._tables[grain] = (rollup, patient_offsets(rollup['patient_id']))
+        self._rebuilt = {grain: {} for grain in grains}
+
+    def rollup(self, patient_id, grain='D', days=None):
+        """Rollup rows for one patient, oldest period first, optionally only the last `days` days"""
+        rollup = self._rollup(patient_id, grain)
+        if days is None or rollup.empty:
+            return rollup
+        latest = self._rollup(patient_id, 'D')['date_recorded'].iloc[-1]
+        return rollup[rollup['date_recorded'] >= window_start(latest, days, grain)]
+
+    def _rollup(self, patient_id, grain):
+        version = self.patient_index.patient_version(patient_id)
+        if version <= self._built_version:
+            rollup, offsets = self._tables[grain]
+            start, stop = offsets.get(patient_id, (0, 0))
+            return rollup.iloc[start:stop]
+
+        rebuilt = self._rebuilt[grain].get(patient_id)
+        if rebuilt is None or rebuilt[0] != version:
+            rollup = build_rollup(self.patient_index.records(patient_id), grain)
+            rebuilt = (version, rollup)
+            with self._lock:
+                self._rebuilt[grain][patient_id] = rebuilt
+        return rebuilt[1]
+
+
+class PatientRollups:
+    """Rollups built from one patient's records on each read.
+
+    For stores such as SQLitePatientStore that are never loaded whole, and
+    for attached snapshots, where full tables would be a private copy in
+    every process. Callers cache the result, as PatientViewCache does.
+    """
+
+    def __init__(self, patient_store):
+        self.patient_store = patient_store
+
+    def rollup(self, patient_id, grain='D', days=None):
+        """Rollup rows for one patient, oldest period first, optionally only the last `days` days"""
+        latest = self.patient_store.latest_reading(patient_id) if days is not None else None
+        if latest is None:
+            return build_rollup(self.patient_store.records(patient_id), grain)
+        # Only the window's readings are fetched, through the (patient_id, date_recorded) index
+        start = window_start(latest, days, grain)
+        return build_rollup(self.patient_store.records(patient_id, start=start.strftime('%Y-%m-%d')), grain)
@@ -0,0 +1,244 @@
+# Sai
+
+import argparse
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+import numpy as np
+import pandas as pd
+
+from patient_data import DETAILS_CSV, HISTORY_CSV, RECORDS_CSV, normalise_patient_ids
+
+# With DIAGNOGRAPH_SQLITE set, the dashboard reads patients from this database
+# instead of loading the CSV files into memory
+SQLITE_PATH = os.environ.get("DIAGNOGRAPH_SQLITE")
+DEFAULT_DB = "diagnograph.db"
+
+INDEXES = [
+    "CREATE INDEX details_patient ON details (patient_id)",
+    "CREATE INDEX history_patient ON history (patient_id)",
+    "CREATE INDEX records_patient_date ON records (patient_id, date_recorded)",
+]
+# Idle read-only connections kept open for reuse by any thread
+POOL_SIZE = int(os.environ.get("DIAGNOGRAPH_SQLITE_POOL", 4))
+# CSV rows parsed and inserted per batch during an import
+IMPORT_CHUNK_ROWS = 200_000
+
+
+def import_csv(db_path=DEFAULT_DB, details_path=DETAILS_CSV, history_path=HISTORY_CSV, records_path=RECORDS_CSV,
+               chunk_rows=IMPORT_CHUNK_ROWS):
+    """Build a database from the three CSV files and swap it in at `db_path`.
+
+    The CSV files are streamed in chunks, so memory stays flat at any size.
+    Indexes are built after the rows are in. The finished file replaces
+    `db_path` atomically, and running stores reopen it on their next refresh().
+    Returns the row count of each table.
+    """
+    temporary = f"{db_path}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    paths = {'details': details_path, 'history': history_path, 'records': records_path}
+    counts = {}
+    connection = sqlite3.connect(temporary)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        for table, path in paths.items():
+            counts[table] = 0
+            for chunk in pd.read_csv(path, chunksize=chunk_rows):
+                chunk = normalise_patient_ids(chunk)
+                chunk.to_sql(table, connection, if_exists='append', index=False, dtype={'patient_id': 'TEXT'})
+                counts[table] += len(chunk)
+        for statement in INDEXES:
+            connection.execute(statement)
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temporary, db_path)
+    return counts
+
+
+class SQLitePatientStore:
+    """Patient-keyed reads from a database written by `python sqlite_store.py import`.
+
+    Offers the per-patient side of PatientIndex (details, history, records,
+    patient_version, subscribe) without loading the tables: each lookup is a
+    query on the (patient_id, date_recorded) index. Queries borrow a read-only
+    connection from a shared pool, so reruns on fresh script threads reuse
+    the same few connections. When the import tool swaps in a new file,
+    refresh() bumps `version` so per-patient caches rebuild, and every pooled
+    connection is reopened on the new file.
+    """
+
+    def __init__(self, path=DEFAULT_DB, pool_size=POOL_SIZE):
+        self.path = os.path.abspath(path)
+        self.snapshot = None
+        self.version = 0
+        self._identity = self._stat()
+        self._pool = queue.Queue(maxsize=pool_size)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _open(self):
+        connection = sqlite3.connect(f"file:{pathname2url(self.path)}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only = ON")
+        return self.version, connection
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrow a pooled connection to the current file, opening one when none is idle"""
+        try:
+            version, connection = self._pool.get_nowait()
+        except queue.Empty:
+            version, connection = self._open()
+        if version != self.version:
+            connection.close()
+            version, connection = self._open()
+        try:
+            yield connection
+        finally:
+            try:
+                if version != self.version:
+                    raise queue.Full
+                self._pool.put_nowait((version, connection))
+            except queue.Full:
+                connection.close()
+
+    def _close_idle(self):
+        while True:
+            try:
+                _, connection = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+
+    def _query(self, sql, params=()):
+        with self._connection() as connection:
+            frame = pd.read_sql_query(sql, connection, params=params)
+        # NULL comes back as None; the CSV path reads missing text as NaN
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = frame[column].where(frame[column].notna(), np.nan)
+        return frame
+
+    def details(self, patient_id):
+        """Rows of all_patients_details.csv for one patient"""
+        return self._query("SELECT * FROM details WHERE patient_id = ? ORDER BY rowid", (patient_id,))
+
+    def history(self, patient_id):
+        """Rows of medical_history.csv for one patient"""
+        return self._query("SELECT * FROM history WHERE patient_id = ? ORDER BY rowid", (patient_id,))
+
+    def records(self, patient_id, start=None, end=None):
+        """Rows of health_records.csv for one patient, oldest first, optionally within [start, end]"""
+        sql = "SELECT * FROM records WHERE patient_id = ?"
+        params = [patient_id]
+        if start is not None:
+            sql += " AND date_recorded >= ?"
+            params.append(str(start))
+        if end is not None:
+            sql += " AND date_recorded <= ?"
+            params.append(str(end))
+        return self._query(sql + " ORDER BY date_recorded, rowid", params)
+
+    def latest_reading(self, patient_id):
+        """date_recorded of the patient's newest reading, or None when they have none"""
+        with self._connection() as connection:
+            latest, = connection.execute("SELECT MAX(date_recorded) FROM records WHERE patient_id = ?",
+                                         (patient_id,)).fetchone()
+        return latest
+
+    def cohort_tables(self):
+        """Details, history and each patient's latest reading: what a cohort-wide assessment reads"""
+        latest = self._query(
+            "SELECT records.* FROM records JOIN "
+            "(SELECT patient_id, MAX(date_recorded) AS date_recorded FROM records GROUP BY patient_id) AS latest "
+            "USING (patient_id, date_recorded) ORDER BY records.patient_id, records.rowid")
+        return (self._query("SELECT * FROM details ORDER BY patient_id, rowid"),
+                self._query("SELECT * FROM history ORDER BY patient_id, rowid"),
+                latest)
+
+    def patient_ids(self):
+        """Every patient_id that has personal details"""
+        with self._connection() as connection:
+            rows = connection.execute("SELECT DISTINCT patient_id FROM details ORDER BY patient_id").fetchall()
+        return [patient_id for patient_id, in rows]
+
+    def patient_version(self, patient_id):
+        """Data version at which this patient's records last changed"""
+        return self.version
+
+    def __contains__(self, patient_id):
+        with self._connection() as connection:
+            row = connection.execute("SELECT 1 FROM details WHERE patient_id = ? LIMIT 1", (patient_id,)).fetchone()
+        return row is not None
+
+    def subscribe(self, listener):
+        """Call listener(None) after the database file is replaced"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def refresh(self):
+        """Pick up a database swapped in by the import tool; returns every patient_id when it was"""
+        try:
+            identity = self._stat()
+        except OSError:
+            return set()
+        if identity == self._identity:
+            return set()
+        with self._lock:
+            if identity == self._identity:
+                return set()
+            self._identity = identity
+            self.version += 1
+        # Connections still borrowed are closed when they come back
+        self._close_idle()
+        for listener in self._listeners:
+            listener(None)
+        return set(self.patient_ids())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DiagnoGraph SQLite patient store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("import", help="build the database from the CSV files")
+    load.add_argument("--db", default=SQLITE_PATH or DEFAULT_DB)
+    load.add_argument("--details", default=DETAILS_CSV)
+    load.add_argument("--history", default=HISTORY_CSV)
+    load.add_argument("--records", default=RECORDS_CSV)
+    load.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+
+    query = commands.add_parser("query", help="time a patient lookup against the database")
+    query.add_argument("patient_id")
+    query.add_argument("--db", default=SQLITE_PATH or DEFAULT_DB)
+    query.add_argument("--start", help="first date_recorded to include, e.g. 2025-08-01")
+    query.add_argument("--end", help="last date_recorded to include")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        started = time.perf_counter()
+        counts = import_csv(args.db, args.details, args.history, args.records, args.chunk_rows)
+        print(f"Wrote {', '.join(f'{rows} {table}' for table, rows in counts.items())} rows to {args.db} "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.command == "query":
+        store = SQLitePatientStore(args.db)
+        started = time.perf_counter()
+        records = store.records(args.patient_id, args.start, args.end)
+        elapsed = time.perf_counter() - started
+        print(records.to_string(index=False))
+        print(f"{len(records)} records in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
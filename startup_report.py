@@ -0,0 +1,133 @@
+# Sai
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APPS = ["DiagnoGraph_SourceCode.py", "PredictiveModel.py"]
+# Every session pays for these, so import times are reported on top of them
+BASELINE = ["streamlit", "pandas", "numpy"]
+# Modules worth deferring; the report shows whether the first run loaded each one.
+# streamlit itself already imports plotly and PIL.
+HEAVY_MODULES = ["plotly.express", "sklearn", "joblib", "st_circular_progress"]
+
+FIRST_RUN = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=300)
+app.run()
+finished = time.perf_counter()
+print(json.dumps({'streamlit_import_s': imported - started, 'first_run_s': finished - imported,
+                  'errors': len(app.exception), 'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+def top_level_imports(path):
+    """The module-level import statements of a script, as source text"""
+    with open(path) as file:
+        tree = ast.parse(file.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_profile(code, cwd):
+    """Time `code` under -X importtime in a fresh interpreter, after the BASELINE modules.
+
+    Returns (seconds, {top-level module: seconds}) for the modules `code`
+    imports that the baseline had not already loaded.
+    """
+    baseline = "\n".join(f"import {name}" for name in BASELINE)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{baseline}\n{code}"], cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that triggered them, and
+        # each line follows its children, so a baseline line closes its subtree
+        if name.strip() in BASELINE:
+            modules.clear()
+        elif not name.startswith("  "):
+            modules[name.strip()] = int(cumulative) / 1e6
+    return sum(modules.values()), modules
+
+
+def first_run(path, cwd):
+    """Import streamlit and run the app once in a fresh interpreter, as a new server's first session would"""
+    result = subprocess.run([sys.executable, "-c", FIRST_RUN, path] + HEAVY_MODULES, cwd=cwd, capture_output=True,
+                            text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def profile_tree(root, repeat=5, top=8):
+    report = {}
+    for app in APPS:
+        path = os.path.join(root, app)
+        imports = top_level_imports(path)
+        runs = [import_profile(imports, root) for _ in range(repeat)]
+        total, modules = min(runs, key=lambda run: run[0])
+        first = min((first_run(path, root) for _ in range(repeat)), key=lambda run: run['first_run_s'])
+        report[app] = {
+            'import_s': total,
+            'slowest_imports': dict(sorted(modules.items(), key=lambda item: -item[1])[:top]),
+            **first,
+        }
+    return report
+
+
+def extract_revision(revision, directory):
+    """Write the tracked files of `revision` under `directory`"""
+    archive = os.path.join(directory, "tree.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, revision], cwd=APP_DIR, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory, filter="data")
+    os.remove(archive)
+    return directory
+
+
+def print_report(label, report):
+    print(f"{label} (imports beyond {', '.join(BASELINE)})", file=sys.stderr)
+    for app, stats in report.items():
+        print(f"  {app:<28} imports {stats['import_s'] * 1000:8.1f} ms  first run {stats['first_run_s'] * 1000:8.1f} ms"
+              f"  loaded: {', '.join(stats['loaded']) or '-'}", file=sys.stderr)
+        for name, seconds in stats['slowest_imports'].items():
+            print(f"      {name:<32} {seconds * 1000:8.1f} ms", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and first-run profile of both dashboards")
+    parser.add_argument("--against", help="git revision to profile as well, e.g. HEAD~1")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement; the best is kept")
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports listed per app")
+    parser.add_argument("--out", default="-", help="JSON report file, or - for stdout")
+    args = parser.parse_args()
+
+    report = {'current': profile_tree(APP_DIR, args.repeat, args.top)}
+    print_report("working tree", report['current'])
+    if args.against:
+        with tempfile.TemporaryDirectory() as directory:
+            report[args.against] = profile_tree(extract_revision(args.against, directory), args.repeat, args.top)
+        print_report(args.against, report[args.against])
+        for app in APPS:
+            before, after = report[args.against][app], report['current'][app]
+            print(f"  {app:<28} imports {(before['import_s'] - after['import_s']) * 1000:+8.1f} ms saved, "
+                  f"first run {(before['first_run_s'] - after['first_run_s']) * 1000:+8.1f} ms saved", file=sys.stderr)
+
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
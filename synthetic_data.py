@@ -0,0 +1,155 @@
+# Sai
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from patient_data import DETAILS_CSV, HISTORY_CSV, RECORDS_CSV
+
+# Patients are generated and written this many at a time, so memory stays flat at any scale
+CHUNK_PATIENTS = 100_000
+START_DATE = "2025-08-19"
+
+FIRST_NAMES = [
+    "Gail", "Daisy", "Aarav", "Priya", "John", "Maria", "Wei", "Fatima", "Carlos", "Anika",
+    "David", "Sofia", "Rahul", "Emma", "Kenji", "Leila", "Omar", "Grace", "Ivan", "Meera",
+    "Lucas", "Chloe", "Arjun", "Hannah", "Mateo", "Zara", "Samuel", "Nora", "Vikram", "Ella",
+]
+LAST_NAMES = [
+    "Watson", "Price", "Sharma", "Smith", "Garcia", "Chen", "Khan", "Lopez", "Iyer", "Brown",
+    "Rossi", "Patel", "Tanaka", "Haddad", "Ali", "Kim", "Petrov", "Nair", "Silva", "Martin",
+]
+STREETS = ["Mark Shores", "Burton Street", "Oak Avenue", "Lake Road", "Hill Lane", "Park Drive", "River Court"]
+CITIES = ["Phillipsview", "South Johnbury", "Lake Emily", "North Mary", "Port Daniel", "West Lisa"]
+STATES = ["NY", "WV", "CA", "TX", "FL", "WA", "IL", "OH"]
+
+MEDICATIONS = {
+    'Normal': "None",
+    'Diabetes': "Metformin",
+    'Hypertension': "Amlodipine",
+    'Tachycardia': "Beta-blocker",
+    'Obesity': "Lifestyle modification",
+}
+# Condition combinations with roughly the mix of the shipped medical_history.csv
+CONDITION_MIX = {
+    ('Normal',): 0.22,
+    ('Diabetes',): 0.22,
+    ('Hypertension',): 0.16,
+    ('Tachycardia',): 0.10,
+    ('Diabetes', 'Hypertension'): 0.12,
+    ('Hypertension', 'Tachycardia'): 0.04,
+    ('Hypertension', 'Obesity'): 0.04,
+    ('Diabetes', 'Obesity'): 0.04,
+    ('Diabetes', 'Tachycardia'): 0.02,
+    ('Diabetes', 'Hypertension', 'Tachycardia'): 0.02,
+    ('Diabetes', 'Hypertension', 'Obesity'): 0.02,
+}
+
+# Per-patient baseline range and reading-to-reading noise for each vital
+VITAL_MODEL = {
+    'blood_pressure_systolic': ((100, 150), 8),
+    'blood_pressure_diastolic': ((65, 95), 5),
+    'heart_rate': ((60, 100), 8),
+    'blood_sugar_level': ((80, 170), 15),
+    'respiratory_rate': ((13, 20), 2),
+}
+
+
+def _pick(rng, choices, size):
+    return np.asarray(choices, dtype=object)[rng.integers(0, len(choices), size)]
+
+
+def generate_chunk(first_id, patients, readings, seed, chunk):
+    """Details, history and records for patients first_id .. first_id + patients - 1.
+
+    Each chunk draws from its own generator seeded by (seed, chunk), so a
+    given seed and chunk size always produce the same files.
+    """
+    rng = np.random.default_rng([seed, chunk])
+    ids = np.arange(first_id, first_id + patients)
+
+    street_numbers = rng.integers(100, 9999, patients).astype(str).astype(object)
+    zip_codes = rng.integers(10000, 99999, patients).astype(str).astype(object)
+    phone_numbers = pd.Series(rng.integers(0, 1_000_000, patients)).astype(str).str.zfill(6).to_numpy(object)
+    details = pd.DataFrame({
+        'patient_id': ids,
+        'name': _pick(rng, FIRST_NAMES, patients) + " " + _pick(rng, LAST_NAMES, patients),
+        'age': rng.integers(18, 90, patients),
+        'gender': _pick(rng, ["Male", "Female"], patients),
+        'contact_info': "+91 98" + phone_numbers,
+        'address': (street_numbers + " " + _pick(rng, STREETS, patients) + " "
+                    + _pick(rng, CITIES, patients) + ", " + _pick(rng, STATES, patients) + " " + zip_codes),
+    })
+
+    combos = list(CONDITION_MIX)
+    weights = np.array(list(CONDITION_MIX.values()))
+    chosen = rng.choice(len(combos), patients, p=weights / weights.sum())
+    conditions = np.array([", ".join(combo) for combo in combos], dtype=object)
+    medications = np.array([", ".join(MEDICATIONS[condition] for condition in combo) for combo in combos], dtype=object)
+    history = pd.DataFrame({
+        'patient_id': ids,
+        'previous_medical_condition': conditions[chosen],
+        'medications_used': medications[chosen],
+    })
+
+    rows = patients * readings
+    records = {
+        'patient_id': np.repeat(ids, readings),
+        'date_recorded': np.tile(pd.date_range(START_DATE, periods=readings).strftime("%Y-%m-%d").to_numpy(object),
+                                 patients),
+    }
+    for vital, ((low, high), noise) in VITAL_MODEL.items():
+        baseline = np.repeat(rng.uniform(low, high, patients), readings)
+        values = baseline + rng.normal(0, noise, rows)
+        records[vital] = values.round(2) if vital == 'blood_sugar_level' else np.rint(values).astype(np.int64)
+    records['weight'] = np.repeat(rng.uniform(45, 100, patients).round(2), readings)
+    records['height'] = np.repeat(rng.uniform(1.5, 1.9, patients).round(2), readings)
+    columns = ['patient_id', 'date_recorded', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+               'heart_rate', 'blood_sugar_level', 'weight', 'height', 'respiratory_rate']
+    return details, history, pd.DataFrame(records)[columns]
+
+
+def generate(out, records=10_000, readings=7, seed=42, chunk_patients=CHUNK_PATIENTS):
+    """Write the three CSV files under `out` with about `records` health records.
+
+    Returns the paths written, keyed like the patient_data constants.
+    """
+    os.makedirs(out, exist_ok=True)
+    paths = {name: os.path.join(out, name) for name in (DETAILS_CSV, HISTORY_CSV, RECORDS_CSV)}
+    patients = max(1, -(-records // readings))
+
+    files = {name: open(path, "w", newline="") for name, path in paths.items()}
+    try:
+        for chunk, first in enumerate(range(0, patients, chunk_patients)):
+            size = min(chunk_patients, patients - first)
+            tables = generate_chunk(first + 1, size, readings, seed, chunk)
+            for (name, file), table in zip(files.items(), tables):
+                table.to_csv(file, header=chunk == 0, index=False)
+    finally:
+        for file in files.values():
+            file.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic DiagnoGraph CSV files")
+    parser.add_argument("--records", type=int, default=10_000, help="approximate number of health records")
+    parser.add_argument("--readings", type=int, default=7, help="readings per patient, one per day")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic", help="output directory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    paths = generate(args.out, args.records, args.readings, args.seed)
+    patients = max(1, -(-args.records // args.readings))
+    print(f"Wrote {patients * args.readings} records for {patients} patients to {args.out}/ "
+          f"in {time.perf_counter() - started:.1f}s")
+    for path in paths.values():
+        print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# Sai
+
+import functools
+import os
+import threading
+import time
+from collections import Counter
+
+# Spans and counters are recorded only when enabled, e.g. DIAGNOGRAPH_TELEMETRY=1
+# streamlit run DiagnoGraph_SourceCode.py; disabled, a span is one flag check
+ENABLED = os.environ.get("DIAGNOGRAPH_TELEMETRY", "0") == "1"
+METRICS_FILE = os.environ.get("DIAGNOGRAPH_METRICS_FILE", "metrics.prom")
+
+SPAN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = Counter()
+_spans = {}
+
+
+class Histogram:
+    """Counts of observations per upper bound, rendered in Prometheus text format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation; the max past the last bucket"""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+    def render(self, name, help_text, labels=""):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        selector = f"{{{labels.rstrip(',')}}}" if labels else ""
+        lines.append(f"{name}_sum{selector} {self.sum}")
+        lines.append(f"{name}_count{selector} {self.count}")
+        return lines
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def increment(name, amount=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    with _lock:
+        if name not in _spans:
+            _spans[name] = Histogram(SPAN_BUCKETS)
+        _spans[name].observe(seconds)
+
+
+def counters():
+    """A copy of every counter, by name"""
+    with _lock:
+        return dict(_counters)
+
+
+def spans():
+    """{name: (count, total seconds, p95 seconds, max seconds)} for every span recorded"""
+    with _lock:
+        return {name: (histogram.count, histogram.sum, histogram.quantile(0.95), histogram.max)
+                for name, histogram in _spans.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+
+class Span:
+    """Wall time of a section, recorded under `name` when it stops.
+
+    Use it as a context manager, or call start() and stop() around code
+    that cannot be indented into a with block.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self):
+        if self.started is not None:
+            observe(self.name, time.perf_counter() - self.started)
+            self.started = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _NullSpan:
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    return Span(name) if ENABLED else _NULL_SPAN
+
+
+def timed(name=None):
+    """Decorator recording every call of the function as a span"""
+    def decorate(function):
+        key = name or function.__name__
+
+        @functools.wraps(function)
+        def call(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with Span(key):
+                return function(*args, **kwargs)
+        return call
+    return decorate
+
+
+def counted(cache_decorator, name=None):
+    """Apply a cache decorator such as st.cache_resource and count calls and misses.
+
+    `<name>.calls` goes up on every call and `<name>.misses` only when the
+    cache runs the function body, so the hit rate is 1 - misses / calls.
+    """
+    def decorate(function):
+        key = name or function.__name__
+
+        @functools.wraps(function)
+        def miss(*args, **kwargs):
+            increment(f"{key}.misses")
+            return function(*args, **kwargs)
+
+        cached = cache_decorator(miss)
+
+        @functools.wraps(function)
+        def call(*args, **kwargs):
+            increment(f"{key}.calls")
+            return cached(*args, **kwargs)
+
+        call.clear = cached.clear
+        return call
+    return decorate
+
+
+def cache_hit_rates(values=None):
+    """{name: (calls, misses, hit rate)} for every function wrapped with counted()"""
+    values = counters() if values is None else values
+    rates = {}
+    for counter, calls in values.items():
+        if counter.endswith(".calls") and calls:
+            key = counter[:-len(".calls")]
+            misses = values.get(f"{key}.misses", 0)
+            rates[key] = (calls, misses, 1 - misses / calls)
+    return rates
+
+
+def prometheus_text():
+    """Every span histogram and cache counter in Prometheus text format"""
+    lines = []
+    with _lock:
+        histograms = sorted(_spans.items())
+        values = dict(_counters)
+    if histograms:
+        lines += ["# HELP diagnograph_span_seconds Wall time per dashboard section",
+                  "# TYPE diagnograph_span_seconds histogram"]
+        for name, histogram in histograms:
+            lines += histogram.render("diagnograph_span_seconds", "", labels=f'span="{name}",')[2:]
+
+    rates = sorted(cache_hit_rates(values).items())
+    if rates:
+        lines += ["# HELP diagnograph_cache_calls_total Calls to a cached loader",
+                  "# TYPE diagnograph_cache_calls_total counter"]
+        lines += [f'diagnograph_cache_calls_total{{cache="{name}"}} {calls}' for name, (calls, _, _) in rates]
+        lines += ["# HELP diagnograph_cache_misses_total Calls that ran the loader body",
+                  "# TYPE diagnograph_cache_misses_total counter"]
+        lines += [f'diagnograph_cache_misses_total{{cache="{name}"}} {misses}' for name, (_, misses, _) in rates]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def export(path=None):
+    """Write prometheus_text() to the metrics file, for a node_exporter textfile collector or similar"""
+    if not ENABLED:
+        return
+    path = path or METRICS_FILE
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as file:
+        file.write(prometheus_text())
+    os.replace(temporary, path)
+
+
+def admin_panel():
+    """Timings and cache hit rates in the sidebar, shown only with ?admin=1 in the URL"""
+    import streamlit as st
+
+    if st.query_params.get("admin") != "1":
+        return
+    with st.sidebar.expander("Performance", expanded=True):
+        recording = st.toggle("Record timings", value=ENABLED)
+        if recording != ENABLED:
+            enable(recording)
+            st.rerun()
+
+        recorded = spans()
+        if recorded:
+            st.dataframe([{'section': name, 'runs': count, 'mean ms': round(total / count * 1000, 1),
+                           'p95 ms': round(p95 * 1000, 1), 'max ms': round(longest * 1000, 1)}
+                          for name, (count, total, p95, longest) in sorted(recorded.items())], hide_index=True)
+        rates = cache_hit_rates()
+        if rates:
+            st.dataframe([{'cache': name, 'calls': calls, 'misses': misses, 'hit rate': f"{rate:.1%}"}
+                          for name, (calls, misses, rate) in sorted(rates.items())], hide_index=True)
+        if not recorded and not rates:
+            st.caption("Nothing recorded yet.")
+
+        col1, col2 = st.columns(2)
+        if col1.button("Reset"):
+            reset()
+            st.rerun()
+        col2.download_button("Metrics", prometheus_text(), file_name="metrics.prom", mime="text/plain")
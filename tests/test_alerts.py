@@ -0,0 +1,47 @@
+# Sai
+
+import numpy as np
+import pandas as pd
+
+from alerts import evaluate_alerts
+from risk_assessment import NORMAL_RANGES
+
+
+def records(count=300, seed=5):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'patient_id': np.sort(rng.integers(1, 20, count)).astype(str),
+        'date_recorded': pd.date_range("2025-01-01", periods=count, freq="D").astype(str),
+        'blood_pressure_systolic': rng.integers(80, 170, count),
+        'blood_pressure_diastolic': rng.integers(50, 110, count),
+        'heart_rate': rng.integers(45, 120, count),
+        'blood_sugar_level': rng.uniform(60, 200, count).round(2),
+        'weight': rng.uniform(40, 120, count).round(2),
+        'height': rng.uniform(1.5, 1.95, count).round(2),
+    })
+    frame.loc[7, 'heart_rate'] = np.nan
+    return frame
+
+
+def scalar_alerts(records_df, ranges):
+    """The row-by-row check evaluate_alerts replaces"""
+    alerts = []
+    for row in records_df.to_dict('records'):
+        for vital, (low, high) in ranges.items():
+            value = round(row['weight'] / row['height'] ** 2, 2) if vital == 'BMI' else row[vital]
+            if value < low or value > high:
+                alerts.append({'patient_id': row['patient_id'], 'date_recorded': row['date_recorded'],
+                               'vital': vital, 'value': float(value), 'low': float(low), 'high': float(high),
+                               'direction': "High" if value > high else "Low"})
+    return alerts
+
+
+def test_evaluate_alerts_matches_row_by_row_check():
+    frame = records()
+    assert evaluate_alerts(frame).to_dict('records') == scalar_alerts(frame, NORMAL_RANGES)
+
+
+def test_no_alerts_for_empty_records():
+    alerts = evaluate_alerts(records().iloc[:0])
+    assert alerts.empty
+    assert list(alerts.columns) == ['patient_id', 'date_recorded', 'vital', 'value', 'low', 'high', 'direction']
@@ -0,0 +1,60 @@
+# Sai
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection import ANOMALY_FEATURES, robust_zscores
+
+
+def records(seed=6):
+    rng = np.random.default_rng(seed)
+    sizes = [1, 2, 3, 8, 30, 45]
+    frame = pd.DataFrame({
+        'patient_id': np.repeat([str(number) for number in range(len(sizes))], sizes),
+        'blood_pressure_systolic': rng.integers(100, 160, sum(sizes)).astype(np.float64),
+        'blood_pressure_diastolic': rng.integers(60, 100, sum(sizes)).astype(np.float64),
+        'heart_rate': rng.integers(55, 110, sum(sizes)).astype(np.float64),
+        'blood_sugar_level': rng.uniform(70, 190, sum(sizes)).round(1),
+    })
+    # A flat stretch gives a zero MAD, which falls back to the population
+    frame.loc[14:20, 'heart_rate'] = 72.0
+    frame.loc[60, 'blood_sugar_level'] = np.nan
+    return frame
+
+
+def scalar_zscores(frame, window, min_history):
+    """Each reading against its own patient's previous readings, one row at a time"""
+    values = frame[ANOMALY_FEATURES].to_numpy(dtype=np.float64)
+    population_median = np.nanmedian(values, axis=0)
+    population_mad = np.nanmedian(np.abs(values - population_median), axis=0)
+    population_mad[population_mad == 0] = 1.0
+    patients = frame['patient_id'].to_numpy()
+
+    z = np.empty_like(values)
+    for row in range(len(values)):
+        start = row
+        while start > 0 and row - start < window and patients[start - 1] == patients[row]:
+            start -= 1
+        for column in range(len(ANOMALY_FEATURES)):
+            history = values[start:row, column]
+            history = history[~np.isnan(history)]
+            median = np.median(history) if len(history) else np.nan
+            mad = np.median(np.abs(history - median)) if len(history) else np.nan
+            if len(history) < min_history or not mad > 0:
+                median, mad = population_median[column], population_mad[column]
+            z[row, column] = 0.6745 * (values[row, column] - median) / mad
+    return z
+
+
+def test_robust_zscores_match_row_by_row():
+    frame = records()
+    for window, min_history in ((20, 3), (5, 2)):
+        expected = scalar_zscores(frame, window, min_history)
+        # The windows are sorted in float32
+        np.testing.assert_allclose(robust_zscores(frame, window=window, min_history=min_history, chunk_rows=17),
+                                   expected, rtol=1e-4, atol=1e-4)
+
+
+def test_missing_reading_scores_nan():
+    z = robust_zscores(records())
+    assert np.isnan(z[60, ANOMALY_FEATURES.index('blood_sugar_level')])
@@ -0,0 +1,32 @@
+# Sai
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from batch_reports import render_json
+
+
+def strict_loads(line):
+    def reject(constant):
+        raise ValueError(f"non-standard JSON constant {constant}")
+    return json.loads(line, parse_constant=reject)
+
+
+def test_render_json_writes_missing_values_as_null():
+    frame = pd.DataFrame({'patient_id': ['12'], 'name': [np.nan], 'age': [41], 'BMI': [22.5],
+                          'date_recorded': [pd.NaT], 'emergency_contact': [None],
+                          'previous_medical_condition': ["Asthma"]})
+    row = frame.to_dict('records')[0]
+    parsed = strict_loads(render_json(row))
+    assert parsed['name'] is None and parsed['date_recorded'] is None and parsed['emergency_contact'] is None
+    assert parsed['patient_id'] == '12' and parsed['previous_medical_condition'] == "Asthma"
+    assert parsed['age'] == 41 and parsed['BMI'] == 22.5
+
+
+def test_render_json_keeps_dates_and_text():
+    row = {'patient_id': '7', 'date_recorded': pd.Timestamp("2025-08-19"), 'medications_used': "Metformin"}
+    parsed = strict_loads(render_json(row))
+    assert parsed['date_recorded'] == "2025-08-19 00:00:00"
+    assert parsed['medications_used'] == "Metformin"
@@ -0,0 +1,62 @@
+# Sai
+
+import numpy as np
+import pandas as pd
+
+from downsample import downsample, lttb_indices, minmax_indices
+
+
+def lttb_reference(x, y, threshold):
+    """Point-by-point LTTB over the same buckets as lttb_indices"""
+    n = len(x)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = [0]
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        a = selected[-1]
+        best, best_area = start, -1.0
+        for point in range(start, stop):
+            area = abs((x[a] - next_x) * (y[point] - y[a]) - (x[a] - x[point]) * (next_y - y[a]))
+            if area > best_area:
+                best, best_area = point, area
+        selected.append(best)
+    return selected + [n - 1]
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 1.5, 1000))
+    y = np.sin(x / 20) * 50 + rng.normal(0, 5, 1000)
+    np.testing.assert_array_equal(lttb_indices(x, y, 100), lttb_reference(x, y, 100))
+
+
+def test_lttb_keeps_ends_and_spike():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[321] = 100
+    kept = lttb_indices(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 499
+    assert np.all(np.diff(kept) > 0)
+    assert 321 in kept
+
+
+def test_lttb_short_series_unchanged():
+    np.testing.assert_array_equal(lttb_indices(np.arange(10.0), np.arange(10.0), 20), np.arange(10))
+
+
+def test_minmax_keeps_extremes():
+    y = np.random.default_rng(1).normal(size=1000)
+    kept = minmax_indices(y, 40)
+    assert np.argmin(y) in kept and np.argmax(y) in kept
+
+
+def test_downsample_budget_and_order():
+    index = pd.date_range("2025-01-01", periods=5000, freq="h")
+    frame = pd.DataFrame({'heart_rate': np.random.default_rng(2).normal(70, 5, 5000)}, index=index)
+    reduced = downsample(frame, budget=200)
+    assert len(reduced) <= 200
+    assert reduced.index.is_monotonic_increasing
+    assert reduced.index[0] == index[0] and reduced.index[-1] == index[-1]
@@ -0,0 +1,60 @@
+# Sai
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from health_scoring import decode_recommendations, round_like_python, score_batch
+
+
+@pytest.fixture(scope="module")
+def dashboard():
+    pytest.importorskip("streamlit")
+    import PredictiveModel
+
+    return PredictiveModel.HealthDashboard()
+
+
+def profiles(count=500, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'age': rng.integers(18, 90, count),
+        'gender': rng.choice(['Male', 'Female'], count),
+        'height': rng.integers(150, 200, count).astype(np.float64),
+        'weight': rng.uniform(45, 130, count).round(1),
+        'heart_rate': rng.integers(50, 110, count),
+        'systolic_bp': rng.integers(95, 170, count),
+        'diastolic_bp': rng.integers(60, 105, count),
+        'blood_sugar': rng.integers(70, 180, count),
+        'daily_steps': rng.integers(2000, 15000, count),
+        'sleep_hours': rng.normal(7.2, 1.0, count).round(1),
+        'hydration_glasses': rng.integers(3, 12, count),
+    })
+
+
+# Outside `streamlit run` every st.session_state access logs a bare-mode warning
+def test_score_batch_matches_scalar_methods(dashboard, caplog):
+    import streamlit as st
+
+    caplog.set_level("ERROR")
+
+    data = profiles()
+    batch = score_batch(data)
+    for position, profile in enumerate(data.to_dict('records')):
+        st.session_state.user_profile = {'age': profile['age'], 'gender': profile['gender'],
+                                         'height': profile['height'], 'weight': profile['weight']}
+        st.session_state.current_metrics = profile
+        row = batch.iloc[position]
+        assert row['bmi'] == dashboard.calculate_bmi()
+        risks = dashboard.calculate_risk_scores()
+        assert [row['cardiovascular'], row['diabetes'], row['hypertension']] == \
+            [risks['cardiovascular'], risks['diabetes'], risks['hypertension']]
+        assert row['health_score'] == dashboard.calculate_health_score()
+        expected = [entry['category'] for entry in dashboard.generate_recommendations()]
+        assert decode_recommendations(batch['recommendations'].iloc[position]) == expected
+
+
+def test_round_like_python_on_ties():
+    values = np.array([0.125, 2.675, 1.005, 22.45, 24.95, -0.35, 7.0])
+    for decimals in (0, 1, 2):
+        assert round_like_python(values, decimals).tolist() == [round(value, decimals) for value in values.tolist()]
@@ -0,0 +1,39 @@
+# Sai
+
+import numpy as np
+
+from trend_forecast import fit_trends
+
+
+def test_fit_trends_matches_polyfit_per_group():
+    rng = np.random.default_rng(4)
+    x = rng.uniform(20000, 20100, 400)
+    groups = rng.integers(0, 12, 400)
+    values = rng.normal(size=(400, 3)) + x[:, None] * [0.5, -0.2, 0.0]
+    slope, intercept = fit_trends(x, values, groups)
+    for group in range(12):
+        rows = groups == group
+        for column in range(3):
+            expected_slope, expected_intercept = np.polyfit(x[rows], values[rows, column], 1)
+            assert np.isclose(slope[group, column], expected_slope)
+            assert np.isclose(intercept[group, column], expected_intercept, rtol=1e-6)
+
+
+def test_missing_values_only_drop_out_of_their_own_column():
+    x = np.arange(6, dtype=np.float64)
+    values = np.column_stack([2 * x + 1, 3 - x])
+    values[2, 0] = np.nan
+    slope, intercept = fit_trends(x, values)
+    np.testing.assert_allclose(slope[0], [2.0, -1.0])
+    np.testing.assert_allclose(intercept[0], [1.0, 3.0])
+
+
+def test_degenerate_groups():
+    x = np.array([5.0, 1.0, 1.0, 7.0])
+    values = np.array([[4.0], [2.0], [6.0], [np.nan]])
+    slope, intercept = fit_trends(x, values, np.array([0, 1, 1, 2]))
+    # One point, or all points at the same x: a flat line through the mean
+    assert slope[0, 0] == 0 and intercept[0, 0] == 4
+    assert slope[1, 0] == 0 and intercept[1, 0] == 4
+    # No values at all
+    assert np.isnan(intercept[2, 0])
@@ -0,0 +1,122 @@
+# Sai
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from rollups import VITALS
+
+EPOCH = pd.Timestamp("1970-01-01")
+
+
+def fit_trends(x, values, groups=None):
+    """Least-squares line per group and column, all in one pass.
+
+    `values` is a 1-D or 2-D array (rows x metrics) and `groups` holds integer
+    group codes 0..k-1 (None for a single group). Uses centred sums, so
+    large x such as day numbers do not cancel out. Missing values are left
+    out of their own column's fit only. Returns (slope, intercept) arrays
+    shaped (groups, metrics); groups with one point or constant x get a flat
+    line through their mean, and groups with no values in a column get NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    groups = np.zeros(len(x), dtype=np.int64) if groups is None else np.asarray(groups)
+    size = int(groups.max()) + 1 if len(groups) else 0
+
+    slope = np.zeros((size, values.shape[1]))
+    intercept = np.zeros((size, values.shape[1]))
+    for column in range(values.shape[1]):
+        # Rows missing this value get zero weight, so one NaN cannot spread to the whole group
+        valid = ~np.isnan(values[:, column])
+        weight = valid.astype(np.float64)
+        y = np.where(valid, values[:, column], 0.0)
+        counts = np.bincount(groups, weights=weight, minlength=size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x = np.bincount(groups, weights=x * weight, minlength=size) / counts
+            mean_y = np.bincount(groups, weights=y, minlength=size) / counts
+        dx = np.where(valid, x - mean_x[groups], 0.0)
+        sxx = np.bincount(groups, weights=dx * dx, minlength=size)
+        sxy = np.bincount(groups, weights=dx * (y - mean_y[groups]), minlength=size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope[:, column] = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept[:, column] = mean_y - slope[:, column] * mean_x
+    return slope, intercept
+
+
+def day_numbers(dates):
+    """Days since 1970-01-01 as floats"""
+    return ((pd.to_datetime(dates, errors='coerce') - EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64)
+
+
+class TrendStore:
+    """Vital-sign trend lines for every patient, fitted together.
+
+    All patients and vitals are fitted in one batched least-squares pass over
+    the patient index. A patient whose data version has moved on is refitted
+    alone on the next request. forecast() extrapolates to any horizon from
+    the stored slope and intercept, without refitting.
+
+    With batch=False nothing is fitted up front and each patient is fitted
+    on first request, for stores such as SQLitePatientStore that are never
+    loaded whole.
+    """
+
+    def __init__(self, patient_index, vitals=VITALS, batch=True):
+        self.patient_index = patient_index
+        self._lock = threading.Lock()
+        self._refitted = {}
+        if not batch:
+            self.vitals = list(vitals)
+            self._built_version = -1
+            self._fits = {}
+            return
+
+        self._built_version = patient_index.version
+        records_df = patient_index.records_df
+        self.vitals = [vital for vital in vitals if vital in records_df.columns]
+
+        x = day_numbers(records_df['date_recorded'])
+        valid = ~np.isnan(x)
+        codes, patients = pd.factorize(records_df['patient_id'].to_numpy()[valid])
+        values = records_df[self.vitals].to_numpy(dtype=np.float64)[valid]
+        slope, intercept = fit_trends(x[valid], values, codes)
+
+        last_day = pd.Series(x[valid]).groupby(codes).max().to_numpy()
+        self._fits = {
+            patient_id: (slope[code], intercept[code], last_day[code])
+            for code, patient_id in enumerate(patients)
+        }
+
+    def _fit_patient(self, patient_id):
+        records = self.patient_index.records(patient_id)
+        x = day_numbers(records['date_recorded'])
+        valid = ~np.isnan(x)
+        if not valid.any():
+            return None
+        slope, intercept = fit_trends(x[valid], records[self.vitals].to_numpy(dtype=np.float64)[valid])
+        return slope[0], intercept[0], x[valid].max()
+
+    def trend(self, patient_id):
+        """(slope per day, intercept, last reading day) for one patient, or None"""
+        version = self.patient_index.patient_version(patient_id)
+        if version <= self._built_version:
+            return self._fits.get(patient_id)
+
+        refitted = self._refitted.get(patient_id)
+        if refitted is None or refitted[0] != version:
+            refitted = (version, self._fit_patient(patient_id))
+            with self._lock:
+                self._refitted[patient_id] = refitted
+        return refitted[1]
+
+    def forecast(self, patient_id, horizon_days):
+        """Projected value of each vital `horizon_days` after the patient's last reading"""
+        fit = self.trend(patient_id)
+        if fit is None:
+            return None
+        slope, intercept, last_day = fit
+        return pd.Series(intercept + slope * (last_day + horizon_days), index=self.vitals)